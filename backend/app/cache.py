@@ -0,0 +1,177 @@
+# backend/app/cache.py
+"""
+In-process caches. ttl_cache memoizes functions; cached_json serves whole JSON responses keyed by
+route, query string and the data generation, which sessions bump after every commit that wrote
+(ingest, feed refresh, matching, CPE map edits). Both are per process: with several uvicorn workers
+a write is only seen by the worker that made it.
+"""
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from typing import Awaitable, Callable
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard json module
+    orjson = None
+
+# Serialized response bodies kept in memory; 0 disables the response cache
+RESPONSE_CACHE_MB = float(os.getenv("VM_SCOUT_RESPONSE_CACHE_MB", "64"))
+
+_registry: list = []
+_MISS = object()
+
+def ttl_cache(seconds: float):
+    """
+    Memoize a function for `seconds`, keyed by its (hashable) arguments; cleared by invalidate_all().
+    Coroutine functions are supported: the awaited result is cached, not the coroutine.
+    """
+    def deco(fn):
+        store: dict = {}
+        lock = threading.Lock()
+
+        def lookup(args, kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            hit = store.get(key)
+            return key, now, (hit[1] if hit and hit[0] > now else _MISS)
+
+        def remember(key, now, value):
+            with lock:
+                store[key] = (now + seconds, value)
+            return value
+
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def wrapper(*args, **kwargs):
+                key, now, value = lookup(args, kwargs)
+                if value is _MISS:
+                    value = remember(key, now, await fn(*args, **kwargs))
+                return value
+        else:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key, now, value = lookup(args, kwargs)
+                if value is _MISS:
+                    value = remember(key, now, fn(*args, **kwargs))
+                return value
+
+        wrapper.cache_clear = store.clear
+        _registry.append(store)
+        return wrapper
+    return deco
+
+# ---------------- Data generation ----------------
+
+_generation = 0
+_generation_lock = threading.Lock()
+# ETags must not repeat after a restart resets the counter
+_EPOCH = uuid.uuid4().hex[:8]
+_WROTE = "vm_scout_wrote"
+
+def generation() -> int:
+    return _generation
+
+def invalidate_all():
+    """Clear every cache and move to a new data generation."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    for store in _registry:
+        store.clear()
+
+def watch_sessions(session_cls):
+    """Call invalidate_all() after each commit of a session that wrote, once readers can see the data."""
+    def wrote(session, *_):
+        session.info[_WROTE] = True
+
+    def on_execute(state):
+        if not state.is_select:
+            wrote(state.session)
+
+    def on_commit(session):
+        if session.info.pop(_WROTE, False):
+            invalidate_all()
+
+    event.listen(session_cls, "do_orm_execute", on_execute)
+    event.listen(session_cls, "after_flush", wrote)
+    event.listen(session_cls, "after_commit", on_commit)
+
+# ---------------- Response cache ----------------
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=jsonable_encoder)
+    return json.dumps(obj, separators=(",", ":"), default=jsonable_encoder).encode()
+
+class ResponseCache:
+    """LRU of (body, headers) bounded by the total size of the bodies."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+            return hit
+
+    def put(self, key, body: bytes, headers: dict):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (body, headers)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+_responses = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+_registry.append(_responses)
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return bool(header) and etag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+async def cached_json(request: Request, response: Response, build: Callable[[], Awaitable]) -> Response:
+    """
+    JSON response for a read endpoint, built by build() (which may set headers such as X-Next-Cursor
+    on `response`) once per route, query string and generation. The ETag is the generation, so a
+    poller sending If-None-Match gets a 304 without a cache lookup or a query until data changes.
+    """
+    gen = generation()  # read before querying: a write racing with build() leaves this entry unreachable
+    headers = {"ETag": f'"{_EPOCH}-{gen}"', "Cache-Control": "no-cache"}
+    if _not_modified(request, headers["ETag"]):
+        metrics.RESPONSE_CACHE.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), gen)
+    hit = _responses.get(key)
+    if hit is None:
+        metrics.RESPONSE_CACHE.inc(result="miss")
+        hit = (dumps(await build()), dict(response.headers))
+        _responses.put(key, *hit)
+    else:
+        metrics.RESPONSE_CACHE.inc(result="hit")
+    body, extra = hit
+    return Response(body, media_type="application/json", headers={**extra, **headers})
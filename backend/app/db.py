@@ -1,18 +1,120 @@
-from typing import Generator
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncGenerator, Generator
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
+from .cache import watch_sessions
 
-DB_URL = "sqlite:///./vm_scout.db"
+# e.g. postgresql+psycopg://vm:secret@db/vm_scout ; defaults to a local SQLite file
+DB_URL = os.getenv("VM_SCOUT_DB_URL") or os.getenv("DATABASE_URL") or "sqlite:///./vm_scout.db"
+# Same database through an asyncio driver, used by the API routes; derived from DB_URL unless set
+ASYNC_DB_URL = os.getenv("VM_SCOUT_ASYNC_DB_URL")
+
+# Feed refreshes and matcher runs: their own threads, so they hold neither the event loop nor request threads
+JOB_THREADS = int(os.getenv("VM_SCOUT_JOB_THREADS", "4"))
+
+# SQLite profile: "production" applies the pragmas below on every connection, "default" leaves SQLite as is
+SQLITE_PROFILE = os.getenv("VM_SCOUT_SQLITE_PROFILE", "production")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("VM_SCOUT_SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",         # readers no longer block the writer
+    "synchronous": "NORMAL",       # durable at checkpoints; safe with WAL
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": int(os.getenv("VM_SCOUT_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024))),
+    "cache_size": -int(os.getenv("VM_SCOUT_SQLITE_CACHE_KIB", str(64 * 1024))),  # negative = KiB
+    "temp_store": "MEMORY",
+}
+
+# Server databases (PostgreSQL)
+POOL_SIZE = int(os.getenv("VM_SCOUT_DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("VM_SCOUT_DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT_S = int(os.getenv("VM_SCOUT_DB_POOL_TIMEOUT_S", "30"))
+POOL_RECYCLE_S = int(os.getenv("VM_SCOUT_DB_POOL_RECYCLE_S", "1800"))
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_engine(DB_URL, echo=False, future=True)
+def _sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    for k, v in SQLITE_PRAGMAS.items():
+        cur.execute(f"PRAGMA {k}={v}")
+    cur.close()
+
+def make_engine(url: str = DB_URL):
+    if make_url(url).get_backend_name() == "sqlite":
+        eng = create_engine(url, echo=False, future=True,
+                            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False})
+        if SQLITE_PROFILE == "production":
+            event.listen(eng, "connect", _sqlite_pragmas)
+        return eng
+    return create_engine(url, echo=False, future=True, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                         pool_timeout=POOL_TIMEOUT_S, pool_recycle=POOL_RECYCLE_S, pool_pre_ping=True)
+
+def async_url(url: str = DB_URL) -> str:
+    """sqlite -> sqlite+aiosqlite, postgresql[+psycopg2] -> postgresql+asyncpg; psycopg (3) is async-capable as is."""
+    u = make_url(url)
+    backend, driver = u.get_backend_name(), u.get_driver_name()
+    if backend == "sqlite" and driver != "aiosqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql" and driver not in ("asyncpg", "psycopg"):
+        u = u.set(drivername="postgresql+asyncpg")
+    return u.render_as_string(hide_password=False)
+
+def make_async_engine(url: str | None = None):
+    url = url or ASYNC_DB_URL or async_url()
+    if make_url(url).get_backend_name() == "sqlite":
+        eng = create_async_engine(url, echo=False, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+        if SQLITE_PROFILE == "production":
+            event.listen(eng.sync_engine, "connect", _sqlite_pragmas)
+        return eng
+    return create_async_engine(url, echo=False, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                               pool_timeout=POOL_TIMEOUT_S, pool_recycle=POOL_RECYCLE_S, pool_pre_ping=True)
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+async_engine = make_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Every session (sync, async, job threads) moves cached reads to a new data generation when it commits a write
+watch_sessions(Session)
+
 def get_db() -> Generator:
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+_jobs = ThreadPoolExecutor(max_workers=JOB_THREADS, thread_name_prefix="vm-scout-job")
+
+async def run_job(fn, *args, **kwargs):
+    """Await fn(db, *args, **kwargs) run on the job pool with its own sync Session."""
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await asyncio.get_running_loop().run_in_executor(_jobs, call)
+
+def upsert(db: Session, model):
+    """Dialect-specific INSERT supporting .on_conflict_do_update()/.on_conflict_do_nothing()."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+IN_CHUNK = 900  # stays under SQLite's bound-parameter limit
+
+def chunked(seq, size: int = IN_CHUNK) -> list[list]:
+    seq = list(seq)
+    return [seq[n:n + size] for n in range(0, len(seq), size)]
@@ -1,11 +1,23 @@
 # backend/app/main.py
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .db import engine, Base
 from . import models  # ensure models are imported so tables are registered
-from .routers import health, assets, ingest, feeds, match, findings, software
+from . import metrics
+from .db import engine, async_engine
+from .migrations import migrate
+from .routers import health, assets, ingest, feeds, match, findings, history, software, cpe_map, cves
+from .routers import metrics as metrics_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring the schema up to date before serving (disable with VM_SCOUT_AUTO_MIGRATE=0)
+    if os.getenv("VM_SCOUT_AUTO_MIGRATE", "1") != "0":
+        migrate()
+    yield
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="vm-scout API", version="0.2.0")
+    app = FastAPI(title="vm-scout API", version="0.2.0", lifespan=lifespan)
     # Routers
     app.include_router(health.router)
     app.include_router(assets.router)
@@ -13,10 +25,16 @@ def create_app() -> FastAPI:
     app.include_router(feeds.router)
     app.include_router(match.router)
     app.include_router(findings.router)
+    app.include_router(history.router)
+    app.include_router(cves.router)
     app.include_router(software.router)
+    app.include_router(cpe_map.router)
+    app.include_router(metrics_router.router)
+    # Instrumentation: per-route latency, SQL per statement fingerprint, sampled cProfile
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+    metrics.profile_endpoints(app)
+    app.add_middleware(metrics.MetricsMiddleware)
     return app
 
 app = create_app()
-
-# Create tables on startup (dev convenience)
-Base.metadata.create_all(bind=engine)
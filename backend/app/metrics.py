@@ -0,0 +1,290 @@
+# backend/app/metrics.py
+"""
+Process-local metrics exposed in the Prometheus text format by GET /metrics: per-route request
+latency, SQL statement counts/time per fingerprint, and feed/matcher/ingest counters. Also the
+opt-in slow-query log (VM_SCOUT_SLOW_QUERY_MS) and sampled per-request cProfile
+(VM_SCOUT_PROFILE_SAMPLE, adjustable at runtime via PUT /metrics/profiling).
+With several uvicorn workers every process exposes its own values.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import inspect
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("VM_SCOUT_SLOW_QUERY_MS", "0"))  # 0 = off
+PROFILE_SAMPLE = float(os.getenv("VM_SCOUT_PROFILE_SAMPLE", "0"))  # share of requests profiled
+PROFILE_DIR = os.getenv("VM_SCOUT_PROFILE_DIR")  # .prof dumps (pstats format) go here when set
+PROFILE_TOP = 25
+MAX_FINGERPRINTS = 500  # distinct statements tracked; the rest are counted as "other"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0.0)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        out += [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in sorted(items)]
+        return out
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values: dict[tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, v in sorted(items):
+            cum = 0
+            for le, n in zip((*self.buckets, "+Inf"), v):
+                cum += n
+                le_label = f'le="{le}"'
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, le_label)} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {v[-1]:g}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {cum}")
+        return out
+
+REGISTRY: list = []
+
+def render() -> str:
+    return "\n".join(line for m in REGISTRY for line in m.render()) + "\n"
+
+# ---------------- Metrics ----------------
+
+HTTP_REQUESTS = Histogram("vm_scout_http_request_duration_seconds", "Request latency by route template",
+                          ("method", "route", "status"))
+
+DB_QUERIES = Counter("vm_scout_db_queries_total", "SQL statements executed, by statement fingerprint", ("statement",))
+DB_QUERY_SECONDS = Counter("vm_scout_db_query_seconds_total", "Time spent executing SQL, by statement fingerprint",
+                           ("statement",))
+DB_QUERY_ERRORS = Counter("vm_scout_db_query_errors_total", "SQL statements that raised, by statement fingerprint",
+                          ("statement",))
+DB_SLOW_QUERIES = Counter("vm_scout_db_slow_queries_total", "Statements slower than VM_SCOUT_SLOW_QUERY_MS")
+
+INGEST_SECONDS = Histogram("vm_scout_ingest_seconds", "Inventory ingest time by phase: validate/apply per host, commit per transaction", ("phase",))
+INGEST_HOSTS = Counter("vm_scout_ingest_hosts_total", "Inventories processed, by outcome", ("status",))
+
+NVD_PAGES = Counter("vm_scout_nvd_pages_fetched_total", "NVD API pages downloaded")
+NVD_RETRIES = Counter("vm_scout_nvd_fetch_retries_total", "NVD API requests retried", ("reason",))
+CVES_UPSERTED = Counter("vm_scout_cves_upserted_total", "CVE records upserted, by feed", ("feed",))
+CPE_ROWS = Counter("vm_scout_cpe_rows_written_total", "cve_cpes rows written by feed updates")
+KEV_CHANGES = Counter("vm_scout_kev_changes_total", "KEV flags changed", ("change",))
+KEV_FETCHES = Counter("vm_scout_kev_fetches_total", "KEV catalog downloads", ("result",))
+
+MATCH_RUNS = Counter("vm_scout_match_runs_total", "Matcher runs, by mode", ("mode",))
+MATCH_SOFTWARE = Counter("vm_scout_match_software_resolved_total", "Software rows (or groups) resolved", ("mode",))
+MATCH_CANDIDATES = Counter("vm_scout_match_candidates_evaluated_total", "Candidate CPE rows version-checked", ("mode",))
+MATCH_SECONDS = Counter("vm_scout_match_phase_seconds_total", "Matcher time, by phase", ("mode", "phase"))
+FINDINGS_WRITTEN = Counter("vm_scout_findings_written_total", "Finding rows inserted")
+
+RESPONSE_CACHE = Counter("vm_scout_response_cache_total", "Cached JSON reads, by result: hit, miss, not_modified", ("result",))
+
+def record_match(mode: str, timer):
+    """Publish a PhaseTimer (see services/matcher.py) once a run is done."""
+    MATCH_RUNS.inc(mode=mode)
+    MATCH_SOFTWARE.inc(timer.counts.get("software", 0), mode=mode)
+    MATCH_CANDIDATES.inc(timer.counts.get("candidates", 0), mode=mode)
+    for phase, secs in timer.totals.items():
+        MATCH_SECONDS.inc(secs, mode=mode, phase=phase)
+
+# ---------------- SQL ----------------
+
+_PARAMS = re.compile(r"%\(\w+\)s|\$\d+|:\w+\b")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Statement with parameters/literals as ? and IN-lists / VALUES rows collapsed, whitespace squeezed."""
+    s = _SPACE.sub(" ", statement).strip()
+    s = _LITERALS.sub("?", _PARAMS.sub("?", s))
+    s = _LISTS.sub("(?...)", s)
+    s = re.sub(r"(\(\?\.\.\.\)|\(\?\))(?:\s*,\s*(?:\(\?\.\.\.\)|\(\?\)))+", r"\1...", s)
+    return s[:300]
+
+_fingerprints: set[str] = set()
+
+def _label(statement: str) -> str:
+    fp = fingerprint(statement)
+    if fp in _fingerprints:
+        return fp
+    if len(_fingerprints) < MAX_FINGERPRINTS:
+        _fingerprints.add(fp)
+        return fp
+    return "other"
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("vm_scout_query_start", []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("vm_scout_query_start")
+    if not starts:
+        return
+    dt = time.perf_counter() - starts.pop()
+    label = _label(statement)
+    DB_QUERIES.inc(statement=label)
+    DB_QUERY_SECONDS.inc(dt, statement=label)
+    if SLOW_QUERY_MS and dt * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.inc()
+        rows = len(parameters) if executemany and isinstance(parameters, (list, tuple)) else 1
+        print(f"[SQL] slow {dt * 1000:.1f}ms ({rows} param set(s)): {_SPACE.sub(' ', statement)[:1000]}")
+
+def _on_error(ctx):
+    # A failed statement never reaches after_cursor_execute; pop its start here so pooled connections
+    # do not pile up stale entries, and count it. Connect errors come without a statement and pushed no start
+    if ctx.connection is None or ctx.execution_context is None or ctx.statement is None:
+        return
+    starts = ctx.connection.info.get("vm_scout_query_start")
+    if not starts:
+        return
+    dt = time.perf_counter() - starts.pop()
+    label = _label(ctx.statement)
+    DB_QUERIES.inc(statement=label)
+    DB_QUERY_SECONDS.inc(dt, statement=label)
+    DB_QUERY_ERRORS.inc(statement=label)
+
+def instrument_engine(engine: Engine):
+    if getattr(engine, "_vm_scout_instrumented", False):
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+    engine._vm_scout_instrumented = True
+
+# ---------------- Requests ----------------
+
+_profile_sample = PROFILE_SAMPLE
+_profiles: contextvars.ContextVar[list | None] = contextvars.ContextVar("vm_scout_profiles", default=None)
+_loop_profiler = threading.Lock()  # one sampled request at a time: a thread can only run one profiler
+
+def profile_sample() -> float:
+    return _profile_sample
+
+def set_profile_sample(rate: float):
+    global _profile_sample
+    _profile_sample = min(max(rate, 0.0), 1.0)
+
+def _route_label(scope) -> str:
+    # The route template, not the raw path, so /assets/{asset_id} is one series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (streamed responses are timed to their last chunk). A sampled request
+    is profiled on the event loop thread, which also sees other requests interleaved with it,
+    and in the threadpool thread that runs a sync endpoint (see profile_endpoints).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiles = token = None
+        if _profile_sample and random.random() < _profile_sample and _loop_profiler.acquire(blocking=False):
+            profiles = [cProfile.Profile()]
+            token = _profiles.set(profiles)
+            profiles[0].enable()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            dt = time.perf_counter() - t0
+            route = _route_label(scope)
+            HTTP_REQUESTS.observe(dt, method=scope["method"], route=route, status=str(status))
+            if profiles:
+                profiles[0].disable()
+                _profiles.reset(token)
+                _loop_profiler.release()
+                _report_profile(f"{scope['method']} {route}", dt, profiles)
+
+def _profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiles = _profiles.get()
+        if profiles is None:
+            return fn(*args, **kwargs)
+        p = cProfile.Profile()
+        p.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            p.disable()
+            profiles.append(p)
+    return wrapper
+
+def profile_endpoints(app):
+    """Wrap sync endpoints so a sampled request is also profiled in the threadpool thread that runs it."""
+    from fastapi.routing import APIRoute
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = _profiled(route.dependant.call)
+
+def _report_profile(what: str, dt: float, profiles: list):
+    buf = io.StringIO()
+    stats = pstats.Stats(profiles[0], stream=buf)
+    for p in profiles[1:]:
+        stats.add(p)
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+    print(f"[PROFILE] {what} {dt * 1000:.1f}ms\n{buf.getvalue()}")
+    if PROFILE_DIR:
+        name = re.sub(r"[^A-Za-z0-9]+", "_", what).strip("_")
+        stats.dump_stats(os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{name}.prof"))
@@ -0,0 +1,240 @@
+# backend/app/migration_schema.py
+"""
+Frozen table definitions used by the migration steps in migrations.py, as each step first shipped.
+models.py describes the current schema and keeps changing; these must not. Never edit a table
+here once its step has shipped: change models.py and add a new step (add_column, an index, ...).
+"""
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, \
+    UniqueConstraint
+
+metadata = MetaData()
+
+# ---------------- 1: baseline (the original create_all schema plus the tables added before migrations) ----------------
+
+assets = Table(
+    "assets", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("hostname", String(255), nullable=False, unique=True, index=True),
+    Column("os_name", String(255)),
+    Column("os_version", String(255)),
+    Column("os_build", String(255)),
+    Column("criticality", String(50)),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+software = Table(
+    "software", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("name", String(512), nullable=False, index=True),
+    Column("version", String(128)),
+    Column("publisher", String(256)),
+    Column("cpe_guess", String(512)),
+    UniqueConstraint("asset_id", "name", "version", name="uix_asset_software"),
+)
+
+services = Table(
+    "services", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("protocol", String(10)),
+    Column("local_address", String(64)),
+    Column("local_port", Integer, nullable=False),
+    Column("process", String(256)),
+    Column("banner", String(1024)),
+    UniqueConstraint("asset_id", "protocol", "local_address", "local_port", name="uix_asset_service"),
+)
+
+cves = Table(
+    "cves", metadata,
+    Column("id", String(20), primary_key=True),
+    Column("summary", Text),
+    Column("cvss", Float),
+    Column("severity", String(16)),
+    Column("published", DateTime),
+    Column("kev", Boolean, nullable=False),
+)
+
+cve_cpes = Table(
+    "cve_cpes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("cve_id", String(20), ForeignKey("cves.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("cpe23", String(512), nullable=False, index=True),
+    Column("vendor", String(128), index=True),
+    Column("product", String(256), index=True),
+    Column("vers_start_incl", String(64)),
+    Column("vers_start_excl", String(64)),
+    Column("vers_end_incl", String(64)),
+    Column("vers_end_excl", String(64)),
+)
+
+vuln_findings = Table(
+    "vuln_findings", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("software_id", Integer, ForeignKey("software.id", ondelete="SET NULL")),
+    Column("cve_id", String(20), ForeignKey("cves.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("product", String(256)),
+    Column("detected_version", String(128)),
+    Column("severity", String(16)),
+    Column("cvss", Float),
+    Column("kev", Boolean, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    UniqueConstraint("asset_id", "software_id", "cve_id", name="uix_asset_sw_cve"),
+)
+
+# Created with their tables on a new database; step 2 adds them to databases from before migrations
+FINDINGS_INDEXES = [
+    Index("ix_findings_asset_id_id", vuln_findings.c.asset_id, vuln_findings.c.id),
+    Index("ix_findings_cvss_id", vuln_findings.c.cvss, vuln_findings.c.id),
+    Index("ix_findings_kev_cvss_id", vuln_findings.c.kev, vuln_findings.c.cvss, vuln_findings.c.id),
+    Index("ix_findings_severity_id", vuln_findings.c.severity, vuln_findings.c.id),
+    Index("ix_findings_product_id", vuln_findings.c.product, vuln_findings.c.id),
+]
+
+match_changes = Table(
+    "match_changes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String(16), nullable=False, index=True),
+    Column("asset_id", Integer),
+    Column("software_id", Integer),
+    Column("cve_id", String(20)),
+    Column("vendor", String(128)),
+    Column("product", String(256)),
+    Column("created_at", DateTime, nullable=False),
+)
+
+feed_state = Table(
+    "feed_state", metadata,
+    Column("key", String(64), primary_key=True),
+    Column("value", Text),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+feed_checkpoints = Table(
+    "feed_checkpoints", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("feed", String(32), nullable=False, index=True),
+    Column("window", String(128), nullable=False),
+    Column("next_index", Integer, nullable=False),
+    Column("total", Integer),
+    Column("done", Boolean, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    UniqueConstraint("feed", "window", name="uix_feed_window"),
+)
+
+_RISK_COUNTS = ("critical", "high", "medium", "low", "unknown", "kev")
+
+asset_risk = Table(
+    "asset_risk", metadata,
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), primary_key=True),
+    *(Column(c, Integer, nullable=False) for c in _RISK_COUNTS),
+    Column("total", Integer, nullable=False),
+    Column("max_cvss", Float),
+    Column("risk_score", Float, nullable=False, index=True),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+product_risk = Table(
+    "product_risk", metadata,
+    Column("product", String(256), primary_key=True),
+    Column("assets", Integer, nullable=False),
+    *(Column(c, Integer, nullable=False) for c in _RISK_COUNTS),
+    Column("total", Integer, nullable=False, index=True),
+    Column("max_cvss", Float),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+BASELINE = [assets, software, services, cves, cve_cpes, vuln_findings, match_changes, feed_state, feed_checkpoints,
+            asset_risk, product_risk]
+
+# The tables the code before migrations created; check_upgrade() starts from these
+PRE_MIGRATIONS = [assets, software, services, cves, cve_cpes, vuln_findings]
+
+# ---------------- 3: software_cpe_map ----------------
+
+software_cpe_map = Table(
+    "software_cpe_map", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name_norm", String(512), nullable=False),
+    Column("publisher_norm", String(256), nullable=False),
+    Column("source", String(16), nullable=False),
+    Column("candidates", Text, nullable=False),
+    Column("signature", String(64)),
+    Column("updated_at", DateTime, nullable=False),
+    UniqueConstraint("name_norm", "publisher_norm", name="uix_cpe_map_name_pub"),
+)
+
+# ---------------- 4: service exposure (columns added with add_column) ----------------
+
+_findings_v4 = Table("vuln_findings", MetaData(), Column("id", Integer), Column("cvss", Float), Column("kev", Boolean),
+                     Column("exposed", Boolean))
+EXPOSURE_INDEX = Index("ix_findings_exposed_kev_cvss_id", _findings_v4.c.exposed, _findings_v4.c.kev, _findings_v4.c.cvss,
+                       _findings_v4.c.id)
+
+# ---------------- 5: cve full-text search (dialect-specific, so raw SQL; see services/cve_search.py) ----------------
+
+SEARCH_DDL = {
+    "sqlite": ["CREATE VIRTUAL TABLE IF NOT EXISTS cve_fts USING fts5(cve_id, summary, products, "
+               "tokenize='unicode61 remove_diacritics 2')"],
+    "postgresql": ["CREATE TABLE IF NOT EXISTS cve_search (cve_id VARCHAR(20) PRIMARY KEY "
+                   "REFERENCES cves(id) ON DELETE CASCADE, document TSVECTOR NOT NULL)",
+                   "CREATE INDEX IF NOT EXISTS ix_cve_search_document ON cve_search USING GIN (document)"],
+}
+SEARCH_TABLE = {"sqlite": "cve_fts", "postgresql": "cve_search"}
+
+# {where} filters cves c; step 5 backfills every CVE, step 7 the ids it binds as :ids
+SEARCH_INSERT = {
+    "sqlite": """
+        INSERT INTO cve_fts (rowid, cve_id, summary, products)
+        SELECT CAST(substr(c.id, 5, 4) AS INTEGER) * 100000000 + CAST(substr(c.id, 10) AS INTEGER),
+               c.id, coalesce(c.summary, ''),
+               coalesce((SELECT group_concat(replace(p.vendor || ' ' || p.product, '_', ' '), ' ')
+                         FROM (SELECT DISTINCT vendor, product FROM cve_cpes WHERE cve_id = c.id) p), '')
+        FROM cves c {where}""",
+    "postgresql": """
+        INSERT INTO cve_search (cve_id, document)
+        SELECT c.id,
+               setweight(to_tsvector('simple', c.id), 'A')
+               || setweight(to_tsvector('simple', coalesce((
+                    SELECT string_agg(DISTINCT translate(p.vendor || ' ' || p.product, '_', ' '), ' ')
+                    FROM cve_cpes p WHERE p.cve_id = c.id), '')), 'B')
+               || setweight(to_tsvector('simple', coalesce(c.summary, '')), 'D')
+        FROM cves c {where}""",
+}
+
+# ---------------- 6: findings history ----------------
+
+finding_events = Table(
+    "finding_events", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("kind", String(8), nullable=False),
+    Column("at", DateTime, nullable=False),
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False),
+    Column("product", String(256), nullable=False),
+    Column("cve_id", String(20), nullable=False),
+    Column("software_id", Integer),
+    Column("severity", String(16)),
+    Column("cvss", Float),
+    Column("kev", Boolean, nullable=False),
+    Column("open_id", Integer),
+    Column("age_s", Integer),
+    Index("ix_finding_events_kind_at", "kind", "at"),
+    Index("ix_finding_events_open_id", "open_id"),
+    Index("ix_finding_events_asset_id_id", "asset_id", "id"),
+)
+
+finding_state = Table(
+    "finding_state", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("asset_id", Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False),
+    Column("product", String(256), nullable=False),
+    Column("cve_id", String(20), nullable=False),
+    Column("open_id", Integer, nullable=False),
+    Column("first_seen", DateTime, nullable=False),
+    Column("opened_at", DateTime, nullable=False),
+    Column("closed_at", DateTime, index=True),
+    Column("reopened", Integer, nullable=False),
+    UniqueConstraint("asset_id", "product", "cve_id", name="uix_finding_state_key"),
+)
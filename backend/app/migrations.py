@@ -0,0 +1,192 @@
+# backend/app/migrations.py
+"""
+Minimal versioned schema migrations. Each step runs once, in order, inside its own
+transaction and is recorded in schema_version. Steps must be idempotent and build only
+the frozen tables in migration_schema.py, never models.py, so what a step does cannot
+change after it shipped. check_upgrade() verifies that the steps still add up to models.py.
+
+    python -m app.migrations          # from backend/
+    python -m app.migrations --check  # migrate scratch databases and compare them with models.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, select, \
+    func, false, literal, null, bindparam, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import Connection, Engine
+from .db import Base, chunked, engine as default_engine
+from . import migration_schema
+from . import models  # noqa: F401  (registers tables on Base.metadata)
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128)),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+def _baseline(conn: Connection):
+    migration_schema.metadata.create_all(conn, tables=migration_schema.BASELINE)
+
+def _ensure_indexes(conn: Connection):
+    # create_all skips indexes on tables that already existed (e.g. the findings pagination indexes)
+    for table in migration_schema.BASELINE:
+        for idx in table.indexes:
+            idx.create(conn, checkfirst=True)
+
+def add_column(conn: Connection, table: str, column: Column):
+    """ALTER TABLE ... ADD COLUMN unless it is already there."""
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    ddl = column.type.compile(dialect=conn.dialect)
+    default = ""
+    if column.server_default is not None:
+        arg = column.server_default.arg
+        default = f" DEFAULT {arg if isinstance(arg, str) else arg.compile(dialect=conn.dialect)}"
+    not_null = " NOT NULL" if not column.nullable and default else ""
+    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column.name} {ddl}{not_null}{default}')
+
+def create_table(name: str) -> Callable[[Connection], None]:
+    def step(conn: Connection):
+        migration_schema.metadata.tables[name].create(conn, checkfirst=True)
+    return step
+
+def _exposure(conn: Connection):
+    add_column(conn, "assets", Column("os_exposed", Boolean, nullable=False, server_default=false()))
+    add_column(conn, "software", Column("exposed", Boolean, nullable=False, server_default=false()))
+    add_column(conn, "vuln_findings", Column("exposed", Boolean, nullable=False, server_default=false()))
+    migration_schema.EXPOSURE_INDEX.create(conn, checkfirst=True)
+
+def _cve_search(conn: Connection):
+    # Dialect-specific (FTS5 / tsvector), so not part of Base.metadata; backfilled from existing CVEs
+    d = conn.dialect.name
+    if d not in migration_schema.SEARCH_DDL:
+        return
+    try:
+        # A savepoint, so a SQLite build without FTS5 leaves the step's transaction usable
+        with conn.begin_nested():
+            for ddl in migration_schema.SEARCH_DDL[d]:
+                conn.exec_driver_sql(ddl)
+    except OperationalError as e:
+        print(f"[migrate] CVE search disabled: {e.orig}")
+        return
+    conn.execute(text(migration_schema.SEARCH_INSERT[d].format(where="")))
+
+def _findings_history(conn: Connection):
+    create_table("finding_events")(conn)
+    create_table("finding_state")(conn)
+    events, states = migration_schema.finding_events, migration_schema.finding_state
+    if conn.execute(select(func.count()).select_from(states)).scalar():
+        return
+    # Findings that exist now open the history, dated when they were written: one open event and
+    # state per (asset, product, cve) key, taken from its first finding
+    f = migration_schema.vuln_findings
+    key = (f.c.asset_id, func.coalesce(f.c.product, ""), f.c.cve_id)
+    first = select(func.min(f.c.id)).where(f.c.asset_id.in_(select(migration_schema.assets.c.id))).group_by(*key)
+    conn.execute(events.insert().from_select(
+        ["kind", "at", "asset_id", "product", "cve_id", "software_id", "severity", "cvss", "kev"],
+        select(literal("open"), func.coalesce(f.c.created_at, literal(datetime.utcnow(), DateTime)), *key,
+               f.c.software_id, f.c.severity, f.c.cvss, f.c.kev).where(f.c.id.in_(first)).order_by(*key)))
+    conn.execute(states.insert().from_select(
+        ["asset_id", "product", "cve_id", "open_id", "first_seen", "opened_at", "closed_at", "reopened"],
+        select(events.c.asset_id, events.c.product, events.c.cve_id, events.c.id, events.c.at, events.c.at,
+               null(), literal(0)).where(events.c.kind == "open").order_by(events.c.id)))
+
+def _kev_search(conn: Connection):
+    # KEV stubs created after step 5 were never indexed; NVD has not filled them, so they have no summary
+    d = conn.dialect.name
+    if d not in migration_schema.SEARCH_TABLE or not inspect(conn).has_table(migration_schema.SEARCH_TABLE[d]):
+        return
+    ids = conn.execute(select(migration_schema.cves.c.id).where(migration_schema.cves.c.summary.is_(None))).scalars().all()
+    table = migration_schema.SEARCH_TABLE[d]
+    for chunk in chunked(ids):
+        param = bindparam("ids", expanding=True)
+        conn.execute(text(f"DELETE FROM {table} WHERE cve_id IN :ids").bindparams(param), {"ids": chunk})
+        conn.execute(text(migration_schema.SEARCH_INSERT[d].format(where="WHERE c.id IN :ids")).bindparams(param),
+                     {"ids": chunk})
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", _baseline),
+    (2, "ensure indexes", _ensure_indexes),
+    (3, "software_cpe_map", create_table("software_cpe_map")),
+    (4, "service exposure", _exposure),
+    (5, "cve full-text search", _cve_search),
+    (6, "findings history", _findings_history),
+    (7, "search KEV-only CVEs", _kev_search),
+]
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+def migrate(engine: Engine = default_engine) -> list[int]:
+    """Apply pending migrations; returns the versions applied."""
+    _meta.create_all(engine)
+    applied = []
+    with engine.connect() as conn:
+        current = current_version(conn)
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+# ---------------- Upgrade check ----------------
+
+def _describe(engine: Engine, tables) -> dict:
+    insp = inspect(engine)
+    out = {}
+    for name in tables:
+        cols = sorted((c["name"], str(c["type"]), c["nullable"]) for c in insp.get_columns(name))
+        idx = sorted((i["name"], tuple(i["column_names"]), bool(i["unique"])) for i in insp.get_indexes(name))
+        uniq = sorted((u["name"], tuple(u["column_names"])) for u in insp.get_unique_constraints(name))
+        out[name] = {"columns": cols, "indexes": idx, "unique": uniq}
+    return out
+
+def _diff(expected: dict, actual: dict, label: str) -> list[str]:
+    problems = []
+    for table, want in expected.items():
+        have = actual.get(table, {})
+        for part, items in want.items():
+            missing = set(items) - set(have.get(part, []))
+            extra = set(have.get(part, [])) - set(items)
+            problems += [f"{label}: {table} {part}: missing {m}" for m in sorted(missing)]
+            problems += [f"{label}: {table} {part}: unexpected {e}" for e in sorted(extra)]
+    return problems
+
+def check_upgrade() -> list[str]:
+    """
+    Migrate a new SQLite database and one laid out like the code before migrations created it, and
+    compare both with models.py. Returns the differences; empty when the steps are complete.
+    """
+    tmp = tempfile.mkdtemp(prefix="vm-scout-migrate-")
+    urls = {name: f"sqlite:///{os.path.join(tmp, name + '.db')}" for name in ("models", "new", "pre_migrations")}
+    engines = {name: create_engine(url) for name, url in urls.items()}
+    try:
+        Base.metadata.create_all(engines["models"])
+        with engines["pre_migrations"].begin() as conn:
+            migration_schema.metadata.create_all(conn, tables=migration_schema.PRE_MIGRATIONS)
+            for idx in migration_schema.FINDINGS_INDEXES:
+                idx.drop(conn)
+        expected = _describe(engines["models"], Base.metadata.tables)
+        problems = []
+        for label in ("new", "pre_migrations"):
+            migrate(engines[label])
+            problems += _diff(expected, _describe(engines[label], Base.metadata.tables), label)
+        return problems
+    finally:
+        for e in engines.values():
+            e.dispose()
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        problems = check_upgrade()
+        print("\n".join(problems) or "migrations match models.py")
+        sys.exit(1 if problems else 0)
+    print(f"applied: {migrate() or 'nothing (up to date)'}")
@@ -2,7 +2,7 @@ from datetime import datetime
 from sqlalchemy import String, Integer, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
-from sqlalchemy import String, Integer, DateTime, ForeignKey, UniqueConstraint, Boolean, Text, Float
+from sqlalchemy import String, Integer, DateTime, ForeignKey, UniqueConstraint, Boolean, Text, Float, Index, false
 
 class Asset(Base):
     __tablename__ = "assets"
@@ -12,6 +12,7 @@ class Asset(Base):
     os_version: Mapped[str | None] = mapped_column(String(255), nullable=True)
     os_build: Mapped[str | None] = mapped_column(String(255), nullable=True)
     criticality: Mapped[str | None] = mapped_column(String(50), nullable=True, default=None)
+    os_exposed: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())  # see services/exposure.py
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -26,6 +27,7 @@ class Software(Base):
     version: Mapped[str | None] = mapped_column(String(128), nullable=True)
     publisher: Mapped[str | None] = mapped_column(String(256), nullable=True)
     cpe_guess: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    exposed: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())  # owns a non-loopback listener
 
     asset: Mapped["Asset"] = relationship(back_populates="software")
     __table_args__ = (UniqueConstraint("asset_id", "name", "version", name="uix_asset_software"),)
@@ -81,6 +83,132 @@ class VulnFinding(Base):
     severity: Mapped[str | None] = mapped_column(String(16), nullable=True)
     cvss: Mapped[float | None] = mapped_column(Float, nullable=True)
     kev: Mapped[bool] = mapped_column(Boolean, default=False)
+    exposed: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())  # copied from software / asset OS
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("asset_id","software_id","cve_id", name="uix_asset_sw_cve"),)
+    __table_args__ = (
+        UniqueConstraint("asset_id","software_id","cve_id", name="uix_asset_sw_cve"),
+        # Keyset pagination / filter paths of GET /findings
+        Index("ix_findings_asset_id_id", "asset_id", "id"),
+        Index("ix_findings_cvss_id", "cvss", "id"),
+        Index("ix_findings_kev_cvss_id", "kev", "cvss", "id"),
+        Index("ix_findings_exposed_kev_cvss_id", "exposed", "kev", "cvss", "id"),
+        Index("ix_findings_severity_id", "severity", "id"),
+        Index("ix_findings_product_id", "product", "id"),
+    )
+
+# --- Findings history (maintained by services/history.py) ---
+
+class FindingEvent(Base):
+    """Append-only open/close transitions of a finding, keyed by (asset_id, product, cve_id)."""
+    __tablename__ = "finding_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(8))  # open | close
+    at: Mapped[datetime] = mapped_column(DateTime)
+    asset_id: Mapped[int] = mapped_column(ForeignKey("assets.id", ondelete="CASCADE"))
+    product: Mapped[str] = mapped_column(String(256), default="")
+    cve_id: Mapped[str] = mapped_column(String(20))
+    software_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # as of the event; None for the OS
+    severity: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    cvss: Mapped[float | None] = mapped_column(Float, nullable=True)
+    kev: Mapped[bool] = mapped_column(Boolean, default=False)
+    open_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # close: the open event it ends
+    age_s: Mapped[int | None] = mapped_column(Integer, nullable=True)    # close: seconds since that open
+
+    __table_args__ = (
+        Index("ix_finding_events_kind_at", "kind", "at"),
+        Index("ix_finding_events_open_id", "open_id"),
+        Index("ix_finding_events_asset_id_id", "asset_id", "id"),
+    )
+
+class FindingState(Base):
+    """Compacted current state: one row per (asset_id, product, cve_id) ever seen."""
+    __tablename__ = "finding_state"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    asset_id: Mapped[int] = mapped_column(ForeignKey("assets.id", ondelete="CASCADE"))
+    product: Mapped[str] = mapped_column(String(256), default="")
+    cve_id: Mapped[str] = mapped_column(String(20))
+    open_id: Mapped[int] = mapped_column(Integer)  # latest open event
+    first_seen: Mapped[datetime] = mapped_column(DateTime)
+    opened_at: Mapped[datetime] = mapped_column(DateTime)
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)  # None while open
+    reopened: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (UniqueConstraint("asset_id", "product", "cve_id", name="uix_finding_state_key"),)
+
+# --- Change tracking for incremental matching ---
+
+class MatchChange(Base):
+    __tablename__ = "match_changes"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(16), index=True)  # software | software_removed | cve | cve_meta | product | os
+    asset_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    software_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    cve_id: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    vendor: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    product: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# --- Software -> CPE resolution cache (maintained by services/cpe_map.py) ---
+
+class SoftwareCPEMap(Base):
+    __tablename__ = "software_cpe_map"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name_norm: Mapped[str] = mapped_column(String(512))
+    publisher_norm: Mapped[str] = mapped_column(String(256), default="")
+    source: Mapped[str] = mapped_column(String(16))  # rule | fuzzy | manual
+    candidates: Mapped[str] = mapped_column(Text)  # JSON [[vendor, product, score], ...]
+    signature: Mapped[str | None] = mapped_column(String(64), nullable=True)  # CPE dictionary + rules it was resolved against
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("name_norm", "publisher_norm", name="uix_cpe_map_name_pub"),)
+
+# --- Feed bookkeeping ---
+
+class FeedState(Base):
+    __tablename__ = "feed_state"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # e.g. nvd.last_sync, kev.etag
+    value: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class FeedCheckpoint(Base):
+    __tablename__ = "feed_checkpoints"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    feed: Mapped[str] = mapped_column(String(32), index=True)
+    window: Mapped[str] = mapped_column(String(128))  # query window identity, e.g. pub:<start>/<end>
+    next_index: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    done: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("feed", "window", name="uix_feed_window"),)
+
+# --- Risk rollups (maintained by services/rollups.py) ---
+
+class AssetRisk(Base):
+    __tablename__ = "asset_risk"
+    asset_id: Mapped[int] = mapped_column(ForeignKey("assets.id", ondelete="CASCADE"), primary_key=True)
+    critical: Mapped[int] = mapped_column(Integer, default=0)
+    high: Mapped[int] = mapped_column(Integer, default=0)
+    medium: Mapped[int] = mapped_column(Integer, default=0)
+    low: Mapped[int] = mapped_column(Integer, default=0)
+    unknown: Mapped[int] = mapped_column(Integer, default=0)
+    kev: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    max_cvss: Mapped[float | None] = mapped_column(Float, nullable=True)
+    risk_score: Mapped[float] = mapped_column(Float, default=0.0, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductRisk(Base):
+    __tablename__ = "product_risk"
+    product: Mapped[str] = mapped_column(String(256), primary_key=True)  # "" for findings without a product
+    assets: Mapped[int] = mapped_column(Integer, default=0)
+    critical: Mapped[int] = mapped_column(Integer, default=0)
+    high: Mapped[int] = mapped_column(Integer, default=0)
+    medium: Mapped[int] = mapped_column(Integer, default=0)
+    low: Mapped[int] = mapped_column(Integer, default=0)
+    unknown: Mapped[int] = mapped_column(Integer, default=0)
+    kev: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(Integer, default=0, index=True)
+    max_cvss: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
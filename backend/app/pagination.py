@@ -0,0 +1,24 @@
+# backend/app/pagination.py
+import base64
+import json
+from fastapi import HTTPException, Response
+
+MAX_LIMIT = 5000
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, n: int) -> list:
+    try:
+        vals = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(400, "invalid cursor")
+    if not isinstance(vals, list) or len(vals) != n:
+        raise HTTPException(400, "invalid cursor")
+    return vals
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> None:
+    """Bodies stay plain lists; the next page is advertised in X-Next-Cursor."""
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(*key(rows[-1]))
@@ -1,20 +1,88 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select, func
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import Asset, Software, Service
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db, AsyncSessionLocal, run_job
+from ..cache import cached_json, ttl_cache
+from ..models import Asset, Software, Service, AssetRisk, ProductRisk
+from ..services import exposure, rollups
+from ..pagination import MAX_LIMIT, decode_cursor, set_next_cursor
 from ..schemas import AssetOut
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
+ASSET_PAGE = 1000  # page size when only a cursor is passed
+
 @router.get("", response_model=list[AssetOut])
-def list_assets(db: Session = Depends(get_db)):
-    rows = db.execute(select(Asset)).scalars().all()
-    return rows
+async def list_assets(
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Every asset, as before pagination, unless limit or cursor asks for pages (X-Next-Cursor)."""
+    async def build():
+        q = select(Asset.id, Asset.hostname, Asset.os_name, Asset.os_version, Asset.os_build).order_by(Asset.id)
+        if limit is None and cursor is None:
+            return [r._asdict() for r in await db.execute(q)]
+        page = limit or ASSET_PAGE
+        if cursor:
+            (last_id,) = decode_cursor(cursor, 1)
+            q = q.where(Asset.id > last_id)
+        rows = (await db.execute(q.limit(page))).all()
+        set_next_cursor(response, rows, page, lambda r: (r.id,))
+        return [r._asdict() for r in rows]
+    return await cached_json(request, response, build)
+
+SUMMARY_TTL_S = 30.0
+
+@ttl_cache(SUMMARY_TTL_S)
+async def _summary() -> dict:
+    async with AsyncSessionLocal() as db:
+        count_assets = await db.scalar(select(func.count()).select_from(Asset)) or 0
+        count_sw = await db.scalar(select(func.count()).select_from(Software)) or 0
+        count_svcs = await db.scalar(select(func.count()).select_from(Service)) or 0
+        risk = await db.run_sync(rollups.fleet_summary)
+        return {"assets": count_assets, "software": count_sw, "services": count_svcs, "risk": risk}
 
 @router.get("/summary")
-def asset_summary(db: Session = Depends(get_db)):
-    count_assets = db.scalar(select(func.count()).select_from(Asset)) or 0
-    count_sw = db.scalar(select(func.count()).select_from(Software)) or 0
-    count_svcs = db.scalar(select(func.count()).select_from(Service)) or 0
-    return {"assets": count_assets, "software": count_sw, "services": count_svcs}
+async def asset_summary(request: Request, response: Response):
+    """Fleet counts and risk rollup; cached in-process until the next write."""
+    return await cached_json(request, response, _summary)
+
+_RISK_COLS = (
+    AssetRisk.asset_id, Asset.hostname, Asset.criticality, AssetRisk.risk_score, AssetRisk.max_cvss, AssetRisk.total,
+    AssetRisk.critical, AssetRisk.high, AssetRisk.medium, AssetRisk.low, AssetRisk.unknown, AssetRisk.kev,
+)
+
+@router.get("/risk")
+async def asset_risk(limit: int = Query(100, ge=1, le=MAX_LIMIT), db: AsyncSession = Depends(get_async_db)):
+    """Assets ranked by risk score (criticality-weighted CVSS + KEV)."""
+    q = select(*_RISK_COLS).join(Asset, Asset.id == AssetRisk.asset_id) \
+        .order_by(AssetRisk.risk_score.desc(), AssetRisk.asset_id).limit(limit)
+    return [r._asdict() for r in await db.execute(q)]
+
+@router.get("/risk/products")
+async def product_risk(limit: int = Query(100, ge=1, le=MAX_LIMIT), db: AsyncSession = Depends(get_async_db)):
+    q = select(ProductRisk).order_by(ProductRisk.total.desc(), ProductRisk.product).limit(limit)
+    return [{
+        "product": p.product or None, "assets": p.assets, "total": p.total, "critical": p.critical, "high": p.high,
+        "medium": p.medium, "low": p.low, "unknown": p.unknown, "kev": p.kev, "max_cvss": p.max_cvss,
+    } for p in (await db.execute(q)).scalars()]
+
+@router.get("/{asset_id}/risk")
+async def asset_risk_one(asset_id: int, db: AsyncSession = Depends(get_async_db)):
+    row = (await db.execute(select(*_RISK_COLS).join(Asset, Asset.id == AssetRisk.asset_id).where(AssetRisk.asset_id == asset_id))).first()
+    if not row:
+        raise HTTPException(404, "no risk rollup for asset")
+    return row._asdict()
+
+@router.post("/exposure/refresh")
+async def refresh_exposure():
+    """Re-read rules/windows/*.yml and recompute which software, OS and findings are network-exposed."""
+    try:
+        rules = exposure.reload_rules()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    n = await run_job(exposure.refresh_all)
+    return {"status": "ok", "processes": len(rules.by_process), "banners": len(rules.banners), "assets_changed": n}
@@ -0,0 +1,76 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..db import get_db
+from ..models import SoftwareCPEMap
+from ..pagination import MAX_LIMIT, decode_cursor, set_next_cursor
+from ..schemas import CPEMapOverride
+from ..services import changes
+from ..services.cpe_map import MANUAL, set_override, delete_override, software_for, map_key, reload_rules
+
+router = APIRouter(prefix="/cpe-map", tags=["cpe-map"])
+
+@router.get("")
+def list_mappings(
+    response: Response,
+    source: str | None = Query(None, pattern="^(rule|fuzzy|manual)$"),
+    cursor: str | None = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Cached software -> (vendor, product) resolutions and manual overrides."""
+    q = select(SoftwareCPEMap)
+    if source:
+        q = q.where(SoftwareCPEMap.source == source)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        q = q.where(SoftwareCPEMap.id > last_id)
+    rows = db.execute(q.order_by(SoftwareCPEMap.id).limit(limit)).scalars().all()
+    set_next_cursor(response, rows, limit, lambda r: (r.id,))
+    return [{
+        "id": m.id, "name": m.name_norm, "publisher": m.publisher_norm or None, "source": m.source,
+        "candidates": [{"vendor": v, "product": p, "score": s} for v, p, s in json.loads(m.candidates)],
+        "updated_at": m.updated_at,
+    } for m in rows]
+
+def _requeue(db: Session, key: tuple[str, str]) -> int:
+    # Mark affected software as changed so POST /match/run?mode=incremental re-resolves it
+    by_asset: dict[int, list[int]] = {}
+    for asset_id, sw_id in software_for(db, key):
+        by_asset.setdefault(asset_id, []).append(sw_id)
+    for asset_id, ids in by_asset.items():
+        changes.record_software(db, asset_id, added=ids)
+    return sum(len(ids) for ids in by_asset.values())
+
+@router.put("/overrides")
+def put_override(body: CPEMapOverride, db: Session = Depends(get_db)):
+    """Pin a software name (+ publisher) to the given CPE products, bypassing rules and fuzzy matching."""
+    if not map_key(body.name, None)[0]:
+        raise HTTPException(400, "name required")
+    key = set_override(db, body.name, body.publisher, [(c.vendor, c.product) for c in body.cpes])
+    n = _requeue(db, key)
+    db.commit()
+    return {"status": "ok", "name": key[0], "publisher": key[1] or None, "source": MANUAL, "software_requeued": n}
+
+@router.delete("/overrides")
+def remove_override(name: str, publisher: str | None = None, db: Session = Depends(get_db)):
+    if not delete_override(db, name, publisher):
+        raise HTTPException(404, "no override for this name/publisher")
+    n = _requeue(db, map_key(name, publisher))
+    db.commit()
+    return {"status": "ok", "software_requeued": n}
+
+@router.post("/rules/reload")
+def reload():
+    """
+    Re-read rules/cpe/*.yml. Cached rule/fuzzy resolutions are recomputed when software is next
+    resolved, but an incremental match only resolves changed software: existing findings follow
+    the new rules after a full match (POST /match/run).
+    """
+    try:
+        rules = reload_rules()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"status": "ok", "aliases": len(rules.aliases), "products": len(rules.products),
+            "full_match_required": True}
@@ -0,0 +1,31 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from ..pagination import decode_cursor, set_next_cursor
+from ..services import cve_search
+
+router = APIRouter(prefix="/cves", tags=["cves"])
+
+@router.get("/search")
+async def search_cves(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=256, description="words must all match; CVE-2021-44228, log4j*, http server"),
+    min_cvss: float | None = None,
+    kev: bool | None = None,
+    published_from: datetime | None = None,
+    published_to: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Full-text search over CVE id, summary and affected CPE vendor/product; lowest score is the best match."""
+    after = tuple(decode_cursor(cursor, 2)) if cursor else None
+    try:
+        rows = await db.run_sync(cve_search.search, q, min_cvss, kev, published_from, published_to, after, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if rows is None:
+        raise HTTPException(501, "CVE search needs SQLite with FTS5 or PostgreSQL")
+    set_next_cursor(response, rows, limit, lambda r: (r["score"], r["id"]))
+    return rows
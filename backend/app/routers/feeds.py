@@ -1,17 +1,31 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..services.feed_nvd import update_nvd
+import os
+from fastapi import APIRouter, HTTPException
+from ..db import run_job
+from ..services.feed_nvd import update_nvd, import_nvd_files, feed_files
 from ..services.feed_kev import update_kev
 
 router = APIRouter(prefix="/feeds", tags=["feeds"])
 
+# Refreshes run on the job pool (db.run_job) with their own sync session, off the event loop
+
 @router.post("/nvd")
-def refresh_nvd(days: int = 30, db: Session = Depends(get_db)):
-    count = update_nvd(db, days=days)
-    return {"status": "ok", "cves_upserted": count, "days": days}
+async def refresh_nvd(days: int = 30, mode: str = "published"):
+    if mode not in ("published", "delta"):
+        raise HTTPException(400, "mode must be 'published' or 'delta'")
+    count = await run_job(update_nvd, days=days, mode=mode)
+    return {"status": "ok", "cves_upserted": count, "days": days, "mode": mode}
+
+@router.post("/nvd/import")
+async def import_nvd():
+    """Seed from NVD JSON 2.0 bulk files (nvdcve-2.0-*.json[.gz|.zip]) found in NVD_FEED_DIR."""
+    feed_dir = os.getenv("NVD_FEED_DIR")
+    if not feed_dir or not os.path.isdir(feed_dir):
+        raise HTTPException(400, "NVD_FEED_DIR is not set to a directory")
+    files = feed_files(feed_dir)
+    count = await run_job(import_nvd_files, files)
+    return {"status": "ok", "cves_upserted": count, "files": [os.path.basename(f) for f in files]}
 
 @router.post("/kev")
-def refresh_kev(db: Session = Depends(get_db)):
-    count = update_kev(db)
-    return {"status": "ok", "kev_marked": count}
+async def refresh_kev():
+    res = await run_job(update_kev)
+    return {"status": "ok", "kev_marked": res["marked"], "kev_cleared": res["cleared"], "not_modified": res["not_modified"]}
@@ -1,26 +1,196 @@
-from fastapi import APIRouter
-from sqlalchemy import select
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..models import VulnFinding
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import cached_json
+from ..db import get_async_db, AsyncSessionLocal
+from ..models import VulnFinding, Asset, CVE
+from ..pagination import MAX_LIMIT, decode_cursor, set_next_cursor
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+except ImportError:  # optional: only needed for format=arrow
+    pa = None
 
 router = APIRouter(prefix="/findings", tags=["findings"])
 
-@router.get("")
-def list_findings(asset_id: int | None = None, limit: int = 500):
-    db: Session = next(get_db())
-    q = select(VulnFinding).order_by(VulnFinding.id.desc())
+EXPORT_BATCH = 5000
+EXPORT_FIELDS = [
+    "id", "asset_id", "hostname", "software_id", "cve", "severity", "cvss", "kev", "exposed",
+    "product", "detected_version", "summary", "published", "created_at",
+]
+
+_COLS = (
+    VulnFinding.id, VulnFinding.asset_id, VulnFinding.software_id, VulnFinding.cve_id, VulnFinding.severity,
+    VulnFinding.cvss, VulnFinding.kev, VulnFinding.exposed, VulnFinding.product, VulnFinding.detected_version,
+)
+
+def _filtered(q, asset_id, severity, kev, exposed, cve, product, min_cvss):
     if asset_id:
         q = q.where(VulnFinding.asset_id == asset_id)
-    rows = db.execute(q).scalars().all()
-    return [{
-        "id": r.id,
-        "asset_id": r.asset_id,
-        "software_id": r.software_id,
-        "cve": r.cve_id,
-        "severity": r.severity,
-        "cvss": r.cvss,
-        "kev": r.kev,
-        "product": r.product,
-        "detected_version": r.detected_version,
-    } for r in rows[:limit]]
+    if severity:
+        q = q.where(VulnFinding.severity == severity.upper())
+    if kev is not None:
+        q = q.where(VulnFinding.kev.is_(kev))
+    if exposed is not None:
+        q = q.where(VulnFinding.exposed.is_(exposed))
+    if cve:
+        q = q.where(VulnFinding.cve_id == cve.upper())
+    if product:
+        q = q.where(VulnFinding.product == product)
+    if min_cvss is not None:
+        q = q.where(VulnFinding.cvss >= min_cvss)
+    return q
+
+def _page(q, order: str, cursor: str | None):
+    """Keyset pagination: order=id -> (id desc); order=cvss -> (cvss desc nulls last, id desc)."""
+    if order == "id":
+        if cursor:
+            (last_id,) = decode_cursor(cursor, 1)
+            q = q.where(VulnFinding.id < last_id)
+        return q.order_by(VulnFinding.id.desc()), lambda r: (r.id,)
+    if order == "cvss":
+        if cursor:
+            last_cvss, last_id = decode_cursor(cursor, 2)
+            if last_cvss is None:
+                q = q.where(VulnFinding.cvss.is_(None), VulnFinding.id < last_id)
+            else:
+                q = q.where(or_(
+                    VulnFinding.cvss < last_cvss,
+                    and_(VulnFinding.cvss == last_cvss, VulnFinding.id < last_id),
+                    VulnFinding.cvss.is_(None),
+                ))
+        return q.order_by(VulnFinding.cvss.desc().nulls_last(), VulnFinding.id.desc()), lambda r: (r.cvss, r.id)
+    raise HTTPException(400, "order must be 'id' or 'cvss'")
+
+@router.get("")
+async def list_findings(
+    request: Request,
+    response: Response,
+    asset_id: int | None = None,
+    severity: str | None = None,
+    kev: bool | None = None,
+    exposed: bool | None = None,
+    cve: str | None = None,
+    product: str | None = None,
+    min_cvss: float | None = None,
+    order: str = "id",
+    cursor: str | None = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    async def build():
+        q = _filtered(select(*_COLS), asset_id, severity, kev, exposed, cve, product, min_cvss)
+        q, key = _page(q, order, cursor)
+        rows = (await db.execute(q.limit(limit))).all()
+        set_next_cursor(response, rows, limit, key)
+        return [{
+            "id": r.id,
+            "asset_id": r.asset_id,
+            "software_id": r.software_id,
+            "cve": r.cve_id,
+            "severity": r.severity,
+            "cvss": r.cvss,
+            "kev": r.kev,
+            "exposed": r.exposed,
+            "product": r.product,
+            "detected_version": r.detected_version,
+        } for r in rows]
+    return await cached_json(request, response, build)
+
+async def _export_rows(q):
+    """Server-side cursor over the export query; yields lists of dicts of EXPORT_BATCH rows."""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(q.execution_options(yield_per=EXPORT_BATCH))
+        async for part in result.partitions():
+            yield [dict(zip(EXPORT_FIELDS, r)) for r in part]
+
+def _iso(v):
+    return v.isoformat() if v is not None else None
+
+async def _ndjson(q):
+    async for batch in _export_rows(q):
+        out = []
+        for r in batch:
+            r["published"], r["created_at"] = _iso(r["published"]), _iso(r["created_at"])
+            out.append(json.dumps(r))
+        yield ("\n".join(out) + "\n").encode()
+
+async def _csv(q):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(EXPORT_FIELDS)
+    async for batch in _export_rows(q):
+        w.writerows([[r[f] for f in EXPORT_FIELDS] for r in batch])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self.parts: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+async def _arrow(q):
+    schema = pa.schema([
+        ("id", pa.int64()), ("asset_id", pa.int64()), ("hostname", pa.string()), ("software_id", pa.int64()),
+        ("cve", pa.string()), ("severity", pa.string()), ("cvss", pa.float64()), ("kev", pa.bool_()), ("exposed", pa.bool_()),
+        ("product", pa.string()), ("detected_version", pa.string()), ("summary", pa.string()),
+        ("published", pa.timestamp("us")), ("created_at", pa.timestamp("us")),
+    ])
+    sink = _Sink()
+    # One record batch per server-side partition; each is flushed to the client as written
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+        async for batch in _export_rows(q):
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+_FORMATS = {
+    "ndjson": (_ndjson, "application/x-ndjson", "ndjson"),
+    "csv": (_csv, "text/csv", "csv"),
+    "arrow": (_arrow, "application/vnd.apache.arrow.stream", "arrow"),
+}
+
+@router.get("/export")
+async def export_findings(
+    format: str = "ndjson",
+    asset_id: int | None = None,
+    severity: str | None = None,
+    kev: bool | None = None,
+    exposed: bool | None = None,
+    cve: str | None = None,
+    product: str | None = None,
+    min_cvss: float | None = None,
+):
+    """Stream every matching finding (with hostname and CVE summary) as NDJSON, CSV or Arrow IPC."""
+    if format not in _FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(_FORMATS)}")
+    if format == "arrow" and pa is None:
+        raise HTTPException(501, "format=arrow requires the 'pyarrow' package")
+    q = select(
+        VulnFinding.id, VulnFinding.asset_id, Asset.hostname, VulnFinding.software_id, VulnFinding.cve_id,
+        VulnFinding.severity, VulnFinding.cvss, VulnFinding.kev, VulnFinding.exposed, VulnFinding.product,
+        VulnFinding.detected_version, CVE.summary, CVE.published, VulnFinding.created_at,
+    ).join(Asset, Asset.id == VulnFinding.asset_id).outerjoin(CVE, CVE.id == VulnFinding.cve_id)
+    q = _filtered(q, asset_id, severity, kev, exposed, cve, product, min_cvss).order_by(VulnFinding.id)
+    gen, media_type, ext = _FORMATS[format]
+    return StreamingResponse(gen(q), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="findings.{ext}"'})
@@ -3,5 +3,5 @@ from fastapi import APIRouter
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
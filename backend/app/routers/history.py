@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from ..models import FindingEvent
+from ..pagination import MAX_LIMIT, decode_cursor, set_next_cursor
+from ..services import history
+
+router = APIRouter(prefix="/findings/history", tags=["findings"])
+
+MAX_TREND_DAYS = 731
+
+def _event(e: FindingEvent) -> dict:
+    return {"event_id": e.id, "kind": e.kind, "at": e.at, "asset_id": e.asset_id, "software_id": e.software_id,
+            "cve": e.cve_id, "product": e.product or None, "severity": e.severity, "cvss": e.cvss, "kev": e.kev,
+            **({"open_id": e.open_id, "age_days": round((e.age_s or 0) / 86400, 2)} if e.kind == history.CLOSE else {})}
+
+def _utc(dt: datetime) -> datetime:
+    """Naive UTC, like the stored timestamps; an offset such as +02:00 is converted, not dropped."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+def _midnight(dt: datetime) -> datetime:
+    return _utc(dt).replace(hour=0, minute=0, second=0, microsecond=0)
+
+@router.get("/as-of")
+async def findings_as_of(
+    response: Response,
+    at: datetime,
+    asset_id: int | None = None,
+    severity: str | None = None,
+    kev: bool | None = None,
+    cursor: str | None = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Findings that were open at `at`, each with the time it was opened (newest first)."""
+    before_id = decode_cursor(cursor, 1)[0] if cursor else None
+    rows = await db.run_sync(history.as_of, _utc(at), asset_id, severity, kev, before_id, limit)
+    set_next_cursor(response, rows, limit, lambda e: (e.id,))
+    return [{**_event(e), "opened_at": e.at} for e in rows]
+
+@router.get("/events")
+async def finding_events(
+    response: Response,
+    asset_id: int | None = None,
+    cve: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(500, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The open/close log, newest first: when a CVE appeared on a host and when it was remediated."""
+    q = select(FindingEvent)
+    if asset_id:
+        q = q.where(FindingEvent.asset_id == asset_id)
+    if cve:
+        q = q.where(FindingEvent.cve_id == cve.upper())
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        q = q.where(FindingEvent.id < last_id)
+    rows = (await db.execute(q.order_by(FindingEvent.id.desc()).limit(limit))).scalars().all()
+    set_next_cursor(response, rows, limit, lambda e: (e.id,))
+    return [_event(e) for e in rows]
+
+@router.get("/mttr")
+async def mean_time_to_remediate(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    kev: bool | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Time from open to close of the findings closed in [since, until); defaults to the last 90 days."""
+    until = _utc(until) if until else datetime.utcnow()
+    since = _utc(since) if since else until - timedelta(days=90)
+    return await db.run_sync(history.mttr, since, until, kev)
+
+@router.get("/trend")
+async def findings_trend(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    bucket: str = Query("day", pattern="^(day|week)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Opened, closed and still-open counts per day or week; defaults to the last 30 days."""
+    until = _midnight(until or datetime.utcnow()) + timedelta(days=1)
+    since = _midnight(since or until - timedelta(days=30))
+    if since >= until or (until - since).days > MAX_TREND_DAYS:
+        raise HTTPException(400, f"since must be before until and at most {MAX_TREND_DAYS} days earlier")
+    return await db.run_sync(history.trend, since, until, 7 if bucket == "week" else 1)
@@ -1,58 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import select, delete
-from datetime import datetime
-from ..db import get_db
-from ..models import Asset, Software, Service
-from ..schemas import InventoryPayload, OSInfo
+import json
+import os
+import queue
+import zlib
+from time import perf_counter
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db, AsyncSessionLocal
+from .. import metrics
+from ..schemas import InventoryPayload
+from ..services.inventory import apply_inventory, apply_payloads
+from ..services.ingest_queue import ingest_queue
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for Content-Encoding: zstd
+    zstandard = None
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
+MAX_LINE_BYTES = 32 * 1024 * 1024
+# Decompressed size of one /ingest/batch body
+MAX_BODY_BYTES = int(os.getenv("VM_SCOUT_INGEST_MAX_MB", "1024")) * 1024 * 1024
+# gzip/deflate output per decompress step
+DECODE_CHUNK = 1024 * 1024
+# zstandard has no output bound, so it gets compressed input in slices this small; a 3-byte
+# RLE block can expand to 128 KiB, which keeps one step at ~11 MiB
+ZSTD_SLICE = 256
+
+class _TooLarge(HTTPException):
+    """A size limit hit while reading an /ingest/batch body; ingest_batch reports what it applied before it."""
+
+    def __init__(self, detail: str):
+        super().__init__(413, detail)
+
 @router.post("/inventory")
-def ingest_inventory(payload: InventoryPayload, db: Session = Depends(get_db)):
-    hostname = payload.hostname.strip()
-    if not hostname:
-        raise HTTPException(status_code=400, detail="hostname required")
-
-    # Upsert asset
-    asset = db.execute(select(Asset).where(Asset.hostname == hostname)).scalar_one_or_none()
-    if not asset:
-        asset = Asset(hostname=hostname)
-        db.add(asset)
-        db.flush()
-
-    # OS fields
-    os_in = payload.os if isinstance(payload.os, OSInfo) else OSInfo(**payload.os)
-    asset.os_name = os_in.name
-    asset.os_version = os_in.version
-    asset.os_build = os_in.build
-    asset.updated_at = datetime.utcnow()
-    db.flush()
-
-    # Replace software/services snapshot for this run
-    db.execute(delete(Software).where(Software.asset_id == asset.id))
-    db.execute(delete(Service).where(Service.asset_id == asset.id))
-    db.flush()
-
-    # Insert software
-    for s in payload.software:
-        db.add(Software(
-            asset_id=asset.id,
-            name=s.name.strip()[:512],
-            version=(s.version or "").strip()[:128] or None,
-            publisher=(s.publisher or "").strip()[:256] or None,
-        ))
-
-    # Insert services
-    for sv in payload.services:
-        db.add(Service(
-            asset_id=asset.id,
-            protocol=(sv.protocol or "").upper()[:10] or None,
-            local_address=(sv.local_address or None),
-            local_port=sv.local_port,
-            process=(sv.process or None),
-            banner=(sv.banner or None),
-        ))
-
-    db.commit()
-    return {"status": "ingested", "asset_id": asset.id, "software": len(payload.software), "services": len(payload.services)}
+async def ingest_inventory(payload: InventoryPayload, mode: str = "sync", db: AsyncSession = Depends(get_async_db)):
+    """mode=sync applies the payload inline; mode=queue hands it to the background writer and returns 202."""
+    if mode == "queue":
+        if not payload.hostname.strip():
+            raise HTTPException(status_code=400, detail="hostname required")
+        try:
+            job = ingest_queue.submit(payload)
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="ingest queue full", headers={"Retry-After": "30"})
+        return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id})
+    if mode != "sync":
+        raise HTTPException(status_code=400, detail="mode must be 'sync' or 'queue'")
+    try:
+        result = await db.run_sync(apply_inventory, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    t0 = perf_counter()
+    await db.commit()
+    metrics.INGEST_SECONDS.observe(perf_counter() - t0, phase="commit")
+    return result
+
+def _decoder(encoding: str):
+    """Streaming decompressor for a Content-Encoding: object with decompress(chunk) and flush()."""
+    encoding = (encoding or "identity").lower()
+    if encoding in ("identity", ""):
+        return None
+    if encoding in ("gzip", "x-gzip", "deflate"):
+        return zlib.decompressobj(zlib.MAX_WBITS | 32)  # auto-detect gzip/zlib header
+    if encoding == "zstd":
+        if zstandard is None:
+            raise HTTPException(415, "zstd support requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise HTTPException(415, f"unsupported Content-Encoding: {encoding}")
+
+def _inflate(d, chunk: bytes):
+    """Decompress chunk in bounded steps, so a small body of a highly compressed record cannot expand at once."""
+    if d is None:
+        yield chunk
+    elif hasattr(d, "unconsumed_tail"):  # zlib
+        while chunk:
+            yield d.decompress(chunk, DECODE_CHUNK)
+            chunk = d.unconsumed_tail
+    else:
+        for i in range(0, len(chunk), ZSTD_SLICE):
+            yield d.decompress(chunk[i:i + ZSTD_SLICE])
+
+async def _iter_lines(request: Request):
+    """Decompress and split the body as it arrives; only one partial line is buffered."""
+    d = _decoder(request.headers.get("content-encoding", ""))
+    parts: list[bytes] = []  # the current partial line
+    partial = total = 0
+
+    def check_total(data: bytes) -> bytes:
+        nonlocal total
+        total += len(data)
+        if total > MAX_BODY_BYTES:
+            raise _TooLarge(f"decompressed body larger than {MAX_BODY_BYTES // (1024 * 1024)} MiB")
+        return data
+
+    async for chunk in request.stream():
+        for data in _inflate(d, chunk):
+            check_total(data)
+            # Newlines are searched in the new bytes only; the partial line is joined once it ends
+            start = 0
+            while (nl := data.find(b"\n", start)) != -1:
+                parts.append(data[start:nl])
+                yield b"".join(parts)
+                parts, partial, start = [], 0, nl + 1
+            if start < len(data):
+                parts.append(data[start:])
+                partial += len(data) - start
+            if partial > MAX_LINE_BYTES:
+                raise _TooLarge("NDJSON record too large")
+    tail = b"".join(parts) + (check_total(d.flush()) if d else b"")
+    for line in tail.split(b"\n"):
+        yield line
+
+async def _run_batch(batch: list[tuple[int, InventoryPayload]]) -> list[dict]:
+    async with AsyncSessionLocal() as db:
+        res = await db.run_sync(apply_payloads, [p for _, p in batch])
+    return [{"line": line_no, **r} for (line_no, _), r in zip(batch, res)]
+
+@router.post("/batch")
+async def ingest_batch(request: Request, batch_size: int = Query(100, ge=1, le=5000)):
+    """
+    NDJSON of InventoryPayload records, optionally gzip/zstd compressed (Content-Encoding).
+    Records are applied and committed every `batch_size` hosts. When the body or a record exceeds
+    a size limit, the records before it are still applied and the 413 carries their results with
+    `truncated_at`, the line that was cut off: resend from there, not the whole body.
+    """
+    results: list[dict] = []
+    batch: list[tuple[int, InventoryPayload]] = []
+    line_no = 0
+    truncated: _TooLarge | None = None
+    try:
+        async for line in _iter_lines(request):
+            line_no += 1
+            if not line.strip():
+                continue
+            t0 = perf_counter()
+            try:
+                batch.append((line_no, InventoryPayload.model_validate_json(line)))
+            except (ValidationError, json.JSONDecodeError) as e:
+                metrics.INGEST_HOSTS.inc(status="invalid")
+                results.append({"line": line_no, "status": "invalid", "error": str(e)})
+                continue
+            finally:
+                metrics.INGEST_SECONDS.observe(perf_counter() - t0, phase="validate")
+            if len(batch) >= batch_size:
+                results.extend(await _run_batch(batch))
+                batch = []
+    except _TooLarge as e:
+        truncated = e
+    if batch:
+        results.extend(await _run_batch(batch))
+
+    results.sort(key=lambda r: r["line"])
+    ok = sum(1 for r in results if r.get("status") == "ingested")
+    out = {"status": "ok", "records": len(results), "ingested": ok, "failed": len(results) - ok, "results": results}
+    if truncated:
+        return JSONResponse(status_code=413, content={
+            **out, "status": "truncated", "truncated_at": line_no + 1, "error": truncated.detail})
+    return out
+
+@router.get("/jobs/{job_id}")
+async def ingest_job(job_id: str):
+    job = ingest_queue.get(job_id)
+    if not job:
+        raise HTTPException(404, "job not found")
+    return job.as_dict()
+
+@router.get("/queue")
+async def ingest_queue_stats():
+    return ingest_queue.stats()
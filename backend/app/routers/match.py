@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..db import get_db
-from ..services.matcher import match_all, match_asset
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from ..db import run_job
+from ..services.matcher import match_asset, match_incremental, PhaseTimer
+from ..services.match_jobs import match_jobs
 
 router = APIRouter(prefix="/match", tags=["match"])
 
 @router.post("/run")
-def run_match(asset_id: int | None = None, db: Session = Depends(get_db)):
+async def run_match(asset_id: int | None = None, mode: str = "full", workers: int | None = Query(None, ge=1, le=64)):
     if asset_id:
-        n = match_asset(db, asset_id)
-        return {"status":"ok", "asset_id": asset_id, "findings": n}
-    n = match_all(db)
-    return {"status":"ok", "assets_processed": n["assets"], "findings_created": n["findings"]}
+        timer = PhaseTimer()
+        n = await run_job(match_asset, asset_id, timer)
+        return {"status":"ok", "asset_id": asset_id, "findings": n, "timings_ms": timer.report()}
+    if mode == "incremental":
+        # A fleet match rewrites findings from its own snapshot and clears the changes it covers;
+        # consuming newer changes underneath it would lose them
+        if (job := match_jobs.active()) is not None:
+            raise HTTPException(409, f"match job {job.id} is {job.status}; retry when it is done")
+        n = await run_job(match_incremental)
+        return {"status":"ok", "mode": mode, **n}
+    if mode != "full":
+        raise HTTPException(400, "mode must be 'full' or 'incremental'")
+    # A fleet-wide match outlives any sane request timeout: run it as a job and poll /match/jobs/{job_id}
+    try:
+        job = match_jobs.submit(workers)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": job.id, "workers": job.workers})
+
+@router.get("/jobs/{job_id}")
+async def match_job(job_id: str):
+    job = match_jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Unknown job id")
+    return job.as_dict()
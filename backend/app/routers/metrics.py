@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from .. import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/profiling")
+def get_profiling():
+    return {"sample": metrics.profile_sample(), "dir": metrics.PROFILE_DIR, "slow_query_ms": metrics.SLOW_QUERY_MS}
+
+@router.put("/metrics/profiling")
+def set_profiling(sample: float = Query(..., ge=0.0, le=1.0)):
+    """Share of requests to run under cProfile (0 turns it off); reports are printed and dumped to VM_SCOUT_PROFILE_DIR."""
+    metrics.set_profile_sample(sample)
+    return {"sample": metrics.profile_sample()}
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from ..db import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..cache import cached_json
+from ..db import get_async_db
 from ..models import Software, Asset
+from ..pagination import MAX_LIMIT, decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/software", tags=["software"])
 
 @router.get("/by-asset/{asset_id}")
-def list_software(asset_id: int, limit: int = 300, db: Session = Depends(get_db)):
-    if not db.get(Asset, asset_id):
-        raise HTTPException(404, "asset not found")
-    rows = db.execute(select(Software).where(Software.asset_id==asset_id).order_by(Software.name)).scalars().all()
-    out = [{"id": s.id, "name": s.name, "version": s.version, "publisher": s.publisher} for s in rows[:limit]]
-    return out
+async def list_software(
+    asset_id: int,
+    request: Request,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(300, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db),
+):
+    async def build():
+        if not await db.scalar(select(Asset.id).where(Asset.id == asset_id)):
+            raise HTTPException(404, "asset not found")
+        q = select(Software.id, Software.name, Software.version, Software.publisher).where(Software.asset_id == asset_id)
+        if cursor:
+            last_name, last_id = decode_cursor(cursor, 2)
+            q = q.where(or_(Software.name > last_name, and_(Software.name == last_name, Software.id > last_id)))
+        rows = (await db.execute(q.order_by(Software.name, Software.id).limit(limit))).all()
+        set_next_cursor(response, rows, limit, lambda r: (r.name, r.id))
+        return [{"id": s.id, "name": s.name, "version": s.version, "publisher": s.publisher} for s in rows]
+    return await cached_json(request, response, build)
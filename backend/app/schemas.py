@@ -27,6 +27,16 @@ class InventoryPayload(BaseModel):
     software: List[SoftwareItem] = []
     services: List[ServiceItem] = []
 
+# -------- Software -> CPE overrides ----------
+class CPEKey(BaseModel):
+    vendor: str
+    product: str
+
+class CPEMapOverride(BaseModel):
+    name: str
+    publisher: Optional[str] = None
+    cpes: List[CPEKey] = []  # empty: the software never matches
+
 # -------- Outbound / API schemas ----------
 class AssetOut(BaseModel):
     id: int
@@ -0,0 +1,72 @@
+# backend/app/services/changes.py
+from dataclasses import dataclass, field
+from typing import Iterable
+from sqlalchemy import select, delete, insert
+from sqlalchemy.orm import Session
+from ..models import MatchChange
+
+SOFTWARE = "software"                  # added (or modified) software row: re-resolve it
+SOFTWARE_REMOVED = "software_removed"  # software row gone: drop its findings
+CVE = "cve"                            # CVE and its CPE list replaced by a feed
+CVE_META = "cve_meta"                  # only severity/cvss/kev changed
+PRODUCT = "product"                    # (vendor, product) present in a changed CVE
+OS = "os"                              # asset OS name/version/build changed: re-match the OS
+
+def _add(db: Session, rows: list[dict]):
+    if rows:
+        db.execute(insert(MatchChange), rows)
+
+def record_software(db: Session, asset_id: int, added: Iterable[int] = (), removed: Iterable[int] = ()):
+    _add(db, [{"kind": SOFTWARE, "asset_id": asset_id, "software_id": i} for i in added]
+         + [{"kind": SOFTWARE_REMOVED, "asset_id": asset_id, "software_id": i} for i in removed])
+
+def record_os(db: Session, asset_id: int):
+    _add(db, [{"kind": OS, "asset_id": asset_id}])
+
+def record_cves(db: Session, cve_ids: Iterable[str], kind: str = CVE):
+    _add(db, [{"kind": kind, "cve_id": c} for c in cve_ids])
+
+def record_products(db: Session, keys: Iterable[tuple[str | None, str | None]]):
+    _add(db, [{"kind": PRODUCT, "vendor": v, "product": p} for v, p in set(keys)])
+
+@dataclass
+class ChangeSet:
+    upto_id: int = 0
+    software: set[int] = field(default_factory=set)
+    software_removed: set[int] = field(default_factory=set)
+    cves: set[str] = field(default_factory=set)
+    cve_meta: set[str] = field(default_factory=set)
+    products: set[tuple[str, str]] = field(default_factory=set)
+    os_assets: set[int] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return self.upto_id > 0
+
+def pending(db: Session) -> ChangeSet:
+    cs = ChangeSet()
+    q = select(MatchChange.id, MatchChange.kind, MatchChange.asset_id, MatchChange.software_id, MatchChange.cve_id,
+               MatchChange.vendor, MatchChange.product).order_by(MatchChange.id)
+    for cid, kind, asset_id, sw_id, cve_id, vendor, product in db.execute(q):
+        cs.upto_id = cid
+        if kind == SOFTWARE:
+            cs.software.add(sw_id)
+            cs.software_removed.discard(sw_id)
+        elif kind == SOFTWARE_REMOVED:
+            cs.software_removed.add(sw_id)
+            cs.software.discard(sw_id)
+        elif kind == CVE:
+            cs.cves.add(cve_id)
+        elif kind == CVE_META:
+            cs.cve_meta.add(cve_id)
+        elif kind == PRODUCT:
+            cs.products.add((vendor or "", product or ""))
+        elif kind == OS:
+            cs.os_assets.add(asset_id)
+    return cs
+
+def clear(db: Session, upto_id: int | None = None):
+    """Drop consumed changes; upto_id bounds it so changes recorded during a run survive."""
+    q = delete(MatchChange)
+    if upto_id is not None:
+        q = q.where(MatchChange.id <= upto_id)
+    db.execute(q)
@@ -0,0 +1,150 @@
+# backend/app/services/cpe_index.py
+import hashlib
+import re
+import threading
+from functools import lru_cache
+from typing import NamedTuple, Iterable
+from datetime import datetime
+from sqlalchemy import Integer, Text, cast, select, func
+from sqlalchemy.orm import Session
+from ..db import upsert
+from ..models import CVECPE, FeedState
+from .versions import VersionRange, compile_range
+
+STOPWORDS = {"microsoft", "inc", "corporation", "corp", "the"}
+
+# Windows 10/11/Server itself; matched against asset builds by services/os_match.py, never by software name
+OS_FAMILY = re.compile(r"windows_(?:10|11|server)(?:_\w+)?")
+
+def is_os_key(vendor: str | None, product: str | None) -> bool:
+    return vendor == "microsoft" and OS_FAMILY.fullmatch(product or "") is not None
+
+def norm(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (s or "").lower()).strip()
+
+@lru_cache(maxsize=65536)
+def tokens(s: str) -> frozenset[str]:
+    return frozenset(t for t in norm(s).split() if len(t) >= 3 and t not in STOPWORDS)
+
+class CPEEntry(NamedTuple):
+    id: int
+    cve_id: str
+    vendor: str | None
+    product: str | None
+    vers_start_incl: str | None
+    vers_start_excl: str | None
+    vers_end_incl: str | None
+    vers_end_excl: str | None
+    range: VersionRange
+
+Key = tuple[str, str]
+
+class CPEIndex:
+    """
+    Read-only snapshot of cve_cpes:
+      - entries sorted by (vendor, product, id)
+      - ranges:  (vendor, product) -> [start, end) slice into entries
+      - by_token: product token -> {(vendor, product)}
+      - keys_digest: hash of the (vendor, product) dictionary, unaffected by CVE-only changes
+    """
+
+    def __init__(self, entries: list[CPEEntry], signature: tuple | None = None):
+        entries.sort(key=lambda e: (e.vendor or "", e.product or "", e.id))
+        self.entries = entries
+        self.signature = signature
+        self.ranges: dict[Key, tuple[int, int]] = {}
+        self.by_token: dict[str, set[Key]] = {}
+        start = 0
+        for i in range(1, len(entries) + 1):
+            if i == len(entries) or _key(entries[i]) != _key(entries[start]):
+                key = _key(entries[start])
+                self.ranges[key] = (start, i)
+                for t in tokens(key[1]):
+                    self.by_token.setdefault(t, set()).add(key)
+                start = i
+        self.vendors = sorted({k[0] for k in self.ranges})
+        digest = hashlib.sha1()
+        for vendor, product in self.ranges:  # already in sorted order
+            digest.update(f"{vendor}\x00{product}\n".encode())
+        self.keys_digest = digest.hexdigest()
+        self._vendor_memo: dict[str, frozenset[Key]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def rows(self, vendor: str, product: str) -> list[CPEEntry]:
+        r = self.ranges.get((vendor, product))
+        return self.entries[r[0]:r[1]] if r else []
+
+    def keys_for_tokens(self, toks: Iterable[str]) -> set[Key]:
+        out: set[Key] = set()
+        for t in toks:
+            out |= self.by_token.get(t, set())
+        return out
+
+    def keys_for_vendor(self, pub: str) -> frozenset[Key]:
+        # Same semantics as the former vendor ILIKE '%pub%': substring over distinct vendors, memoized per publisher
+        hit = self._vendor_memo.get(pub)
+        if hit is None:
+            vendors = {v for v in self.vendors if pub in v.lower()}
+            hit = frozenset(k for k in self.ranges if k[0] in vendors)
+            self._vendor_memo[pub] = hit
+        return hit
+
+def _key(e: CPEEntry) -> Key:
+    return (e.vendor or "", e.product or "")
+
+def _cpe_version(cpe23: str) -> str | None:
+    parts = cpe23.split(":")
+    return parts[5] if len(parts) > 5 else None
+
+GENERATION_KEY = "cpe.generation"
+
+def bump_generation(db: Session):
+    """Mark cve_cpes as changed; every writer of cve_cpes calls this in the same transaction."""
+    now = datetime.utcnow()
+    stmt = upsert(db, FeedState).values(key=GENERATION_KEY, value="1", updated_at=now)
+    db.execute(stmt.on_conflict_do_update(index_elements=[FeedState.key], set_={
+        "value": cast(cast(FeedState.value, Integer) + 1, Text), "updated_at": now}))
+
+def _signature(db: Session) -> tuple[str | None, int]:
+    # The persisted generation: max(id) alone misses deletes and replaced rows (SQLite reuses the top
+    # rowids). max(id) still catches rows written without a bump, such as directly seeded benchmarks
+    gen = db.scalar(select(FeedState.value).where(FeedState.key == GENERATION_KEY))
+    return gen, db.scalar(select(func.max(CVECPE.id))) or 0
+
+def build_index(db: Session) -> CPEIndex:
+    sig = _signature(db)
+    q = select(
+        CVECPE.id, CVECPE.cve_id, CVECPE.vendor, CVECPE.product,
+        CVECPE.vers_start_incl, CVECPE.vers_start_excl, CVECPE.vers_end_incl, CVECPE.vers_end_excl,
+        CVECPE.cpe23,
+    )
+    entries = []
+    for *cols, cpe23 in db.execute(q):
+        if is_os_key(cols[2], cols[3]):
+            continue
+        # Bounds are parsed once here; the matcher only compares keys
+        entries.append(CPEEntry(*cols, compile_range(*cols[4:8], exact=_cpe_version(cpe23))))
+    return CPEIndex(entries, signature=sig)
+
+_index: CPEIndex | None = None
+_lock = threading.Lock()
+
+def get_index(db: Session) -> CPEIndex:
+    """Process-wide index, rebuilt when cve_cpes changed (also catches writes from other processes)."""
+    global _index
+    sig = _signature(db)
+    idx = _index
+    if idx is not None and idx.signature == sig:
+        return idx
+    with _lock:
+        if _index is None or _index.signature != sig:
+            _index = build_index(db)
+        return _index
+
+def refresh_index(db: Session) -> CPEIndex:
+    global _index
+    with _lock:
+        _index = build_index(db)
+        return _index
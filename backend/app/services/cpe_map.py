@@ -0,0 +1,266 @@
+# backend/app/services/cpe_map.py
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, NamedTuple
+import yaml
+from sqlalchemy import select, delete, or_
+from sqlalchemy.orm import Session
+from ..db import chunked, upsert
+from ..models import Software, SoftwareCPEMap
+from .cpe_index import CPEIndex, CPEEntry, Key, norm, tokens
+
+RULES_DIR = Path(os.getenv("VM_SCOUT_RULES_DIR") or Path(__file__).resolve().parents[3] / "rules") / "cpe"
+
+FUZZY_LIMIT = 10000  # candidate CPE rows drawn from fuzzy keys before scoring
+TOP_N = 100          # best-scored candidate rows that go on to the version check
+
+RULE, FUZZY, MANUAL = "rule", "fuzzy", "manual"
+
+class Candidate(NamedTuple):
+    vendor: str
+    product: str
+    score: float
+
+# ---------------- Rules ----------------
+
+class Automaton:
+    """Aho-Corasick automaton over (needle, id) pairs; find() returns the ids of every needle in a text."""
+
+    def __init__(self, needles: Iterable[tuple[str, int]]):
+        self._goto: list[dict[str, int]] = [{}]
+        out: list[set[int]] = [set()]
+        for needle, i in needles:
+            if not needle:
+                continue
+            s = 0
+            for ch in needle:
+                nxt = self._goto[s].get(ch)
+                if nxt is None:
+                    nxt = self._goto[s][ch] = len(self._goto)
+                    self._goto.append({})
+                    out.append(set())
+                s = nxt
+            out[s].add(i)
+        # Breadth-first so a node's failure link is final before its children need it
+        self._fail = [0] * len(self._goto)
+        q = deque(self._goto[0].values())
+        while q:
+            s = q.popleft()
+            for ch, t in self._goto[s].items():
+                q.append(t)
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[t] = self._goto[f].get(ch, 0)
+                out[t] |= out[self._fail[t]]
+        self._out = [frozenset(o) for o in out]
+
+    def find(self, text: str) -> set[int]:
+        s, hits = 0, set()
+        for ch in text:
+            while s and ch not in self._goto[s]:
+                s = self._fail[s]
+            s = self._goto[s].get(ch, 0)
+            if self._out[s]:
+                hits |= self._out[s]
+        return hits
+
+class Rules:
+    """
+    Name rewrites and direct (vendor, product) mappings from rules/cpe/*.yml.
+    Needles are matched as substrings of the normalized name, all at once.
+    """
+
+    def __init__(self, aliases: list[tuple[str, str]], products: list[tuple[str, str, str]], digest: str = ""):
+        self.aliases = aliases
+        self.products = products
+        self.digest = digest
+        self._alias_ac = Automaton((k, i) for i, (k, _) in enumerate(aliases))
+        self._product_ac = Automaton((n, i) for i, (n, _, _) in enumerate(products))
+
+    def alias(self, name: str) -> str:
+        for i in sorted(self._alias_ac.find(name)):
+            k, v = self.aliases[i]
+            name = name.replace(k, v)
+        return name
+
+    def products_for(self, name: str) -> list[Key]:
+        """Mapped (vendor, product) keys for a normalized name, in rule order."""
+        return [self.products[i][1:] for i in sorted(self._product_ac.find(name))]
+
+def load_rules(rules_dir: Path = RULES_DIR) -> Rules:
+    aliases, products = [], []
+    digest = hashlib.sha1()
+    for path in sorted(rules_dir.glob("*.yml")) if rules_dir.is_dir() else []:
+        raw = path.read_bytes()
+        digest.update(raw)
+        doc = yaml.safe_load(raw) or {}
+        for k, v in (doc.get("aliases") or {}).items():
+            aliases.append((norm(str(k)), norm(str(v))))
+        for r in doc.get("products") or []:
+            try:
+                products.append((norm(str(r["match"])), str(r["vendor"]), str(r["product"])))
+            except (KeyError, TypeError):
+                raise ValueError(f"{path.name}: product rules need match, vendor and product: {r!r}")
+    return Rules(aliases, products, digest.hexdigest())
+
+_rules: Rules | None = None
+_rules_lock = threading.Lock()
+
+def get_rules() -> Rules:
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load_rules()
+    return _rules
+
+def reload_rules() -> Rules:
+    global _rules
+    with _rules_lock:
+        _rules = load_rules()
+        return _rules
+
+# ---------------- Resolution ----------------
+
+def map_key(name: str, publisher: str | None) -> tuple[str, str]:
+    return (norm(name), norm(publisher or ""))
+
+def _score(toks: frozenset[str], pub: str, vendor: str, product: str) -> float:
+    score = len(toks & tokens(product))
+    if pub and vendor and vendor in pub:
+        score += 1.0
+    return score
+
+class CPEResolver:
+    """
+    Software -> candidate (vendor, product) keys against one CPE index snapshot.
+    Resolutions are keyed by normalized (name, publisher): prefetch() reuses the ones in
+    software_cpe_map that were made against the same dictionary and rules (manual ones always),
+    anything computed here is kept in .learned until save().
+    """
+
+    def __init__(self, index: CPEIndex, rules: Rules):
+        self.index = index
+        self.rules = rules
+        self.signature = hashlib.sha1(f"{index.keys_digest}:{rules.digest}".encode()).hexdigest()
+        self.cache: dict[tuple[str, str], tuple[str, list[Candidate]]] = {}
+        self.learned: dict[tuple[str, str], tuple[str, list[Candidate]]] = {}
+
+    def prefetch(self, db: Session, rows) -> int:
+        wanted = {map_key(sw.name, sw.publisher) for sw in rows} - self.cache.keys()
+        found = 0
+        for chunk in chunked({n for n, _ in wanted}):
+            q = select(SoftwareCPEMap.name_norm, SoftwareCPEMap.publisher_norm, SoftwareCPEMap.source, SoftwareCPEMap.candidates) \
+                .where(SoftwareCPEMap.name_norm.in_(chunk),
+                       or_(SoftwareCPEMap.signature == self.signature, SoftwareCPEMap.source == MANUAL))
+            for n, p, source, cands in db.execute(q):
+                if (n, p) in wanted:
+                    self.cache[(n, p)] = (source, [Candidate(*c) for c in json.loads(cands)])
+                    found += 1
+        return found
+
+    def candidates(self, sw) -> tuple[str, list[Candidate]]:
+        key = map_key(sw.name, sw.publisher)
+        hit = self.cache.get(key)
+        if hit is None:
+            hit = self.cache[key] = self.learned[key] = self._compute(*key)
+        return hit
+
+    def _compute(self, name: str, pub: str) -> tuple[str, list[Candidate]]:
+        toks = tokens(self.rules.alias(name))
+        # 1) Direct rule mapping, if its product is in the dictionary
+        for vendor, product in self.rules.products_for(name):
+            if (vendor, product) in self.index.ranges:
+                return RULE, [Candidate(vendor, product, _score(toks, pub, vendor, product))]
+        # 2) Fuzzy: every product sharing a name token, plus the publisher's vendors
+        if not toks:
+            return FUZZY, []
+        keys = self.index.keys_for_tokens(toks)
+        if pub:
+            keys |= self.index.keys_for_vendor(pub)
+        return FUZZY, [Candidate(v, p, _score(toks, pub, v, p)) for v, p in sorted(keys)]
+
+    def keys(self, sw) -> set[Key]:
+        return {(c.vendor, c.product) for c in self.candidates(sw)[1]}
+
+    def rows(self, sw) -> list[CPEEntry]:
+        """The TOP_N best-scored CPE rows among the first FUZZY_LIMIT of the candidates' rows."""
+        taken, budget = [], FUZZY_LIMIT
+        for c in self.candidates(sw)[1]:
+            r = self.index.rows(c.vendor, c.product)[:budget]
+            if r:
+                taken.append((c.score, r))
+                budget -= len(r)
+                if budget <= 0:
+                    break
+        taken.sort(key=lambda t: t[0], reverse=True)  # stable: ties keep candidate order
+        out: list[CPEEntry] = []
+        for _, r in taken:
+            out.extend(r[:TOP_N - len(out)])
+            if len(out) >= TOP_N:
+                break
+        return out
+
+    def save(self, db: Session) -> int:
+        """Persist resolutions computed since the last save; never overwrites manual entries."""
+        if not self.learned:
+            return 0
+        now = datetime.utcnow()
+        rows = [{
+            "name_norm": n, "publisher_norm": p, "source": source, "signature": self.signature, "updated_at": now,
+            "candidates": json.dumps([list(c) for c in cands], separators=(",", ":")),
+        } for (n, p), (source, cands) in self.learned.items()]
+        stmt = upsert(db, SoftwareCPEMap)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SoftwareCPEMap.name_norm, SoftwareCPEMap.publisher_norm],
+            set_={c: stmt.excluded[c] for c in ("source", "candidates", "signature", "updated_at")},
+            where=SoftwareCPEMap.source != MANUAL,
+        )
+        db.execute(stmt, rows)
+        self.learned.clear()
+        return len(rows)
+
+    def purge_stale(self, db: Session) -> int:
+        """Drop learned entries resolved against another dictionary or rule set."""
+        return db.execute(delete(SoftwareCPEMap).where(
+            SoftwareCPEMap.source != MANUAL, SoftwareCPEMap.signature != self.signature)).rowcount
+
+def get_resolver(db: Session, index: CPEIndex, rows=()) -> CPEResolver:
+    resolver = CPEResolver(index, get_rules())
+    resolver.prefetch(db, rows)
+    return resolver
+
+# ---------------- Manual overrides ----------------
+
+def set_override(db: Session, name: str, publisher: str | None, keys: list[Key]) -> tuple[str, str]:
+    n, p = map_key(name, publisher)
+    cands = json.dumps([[v, prod, 0.0] for v, prod in keys], separators=(",", ":"))
+    stmt = upsert(db, SoftwareCPEMap).values(
+        name_norm=n, publisher_norm=p, source=MANUAL, candidates=cands, signature=None, updated_at=datetime.utcnow())
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SoftwareCPEMap.name_norm, SoftwareCPEMap.publisher_norm],
+        set_={c: stmt.excluded[c] for c in ("source", "candidates", "signature", "updated_at")},
+    ))
+    return n, p
+
+def delete_override(db: Session, name: str, publisher: str | None) -> bool:
+    n, p = map_key(name, publisher)
+    return db.execute(delete(SoftwareCPEMap).where(
+        SoftwareCPEMap.name_norm == n, SoftwareCPEMap.publisher_norm == p, SoftwareCPEMap.source == MANUAL)).rowcount > 0
+
+def software_for(db: Session, key: tuple[str, str]) -> list[tuple[int, int]]:
+    """(asset_id, software_id) of every software row that resolves through key."""
+    out = []
+    # norm() has no SQL equivalent; narrow on the first name token and compare in Python
+    first = key[0].split(" ", 1)[0]
+    q = select(Software.id, Software.asset_id, Software.name, Software.publisher).where(Software.name.ilike(f"%{first}%"))
+    for sw_id, asset_id, name, pub in db.execute(q):
+        if map_key(name, pub) == key:
+            out.append((asset_id, sw_id))
+    return out
@@ -0,0 +1,150 @@
+# backend/app/services/cve_search.py
+"""
+Full-text index over CVE id, summary and CPE vendor/product names.
+SQLite: FTS5 table cve_fts (rowid derived from the CVE id, see _rowid; ranked by bm25).
+PostgreSQL: cve_search(cve_id, document tsvector) with a GIN index, ranked by ts_rank.
+Rows are rewritten by index_cves() whenever the NVD feed replaces a CVE or the KEV feed adds one.
+The tables are created by migration 5 (see migration_schema.SEARCH_DDL); a SQLite build without FTS5 has none.
+"""
+import re
+from datetime import datetime
+from typing import Iterable
+from sqlalchemy import Boolean, DateTime, bindparam, inspect, text
+from sqlalchemy.orm import Session
+from ..db import chunked
+
+# bm25 column weights: an id hit beats a product hit beats a summary hit
+W_ID, W_SUMMARY, W_PRODUCTS = 10.0, 1.0, 4.0
+
+# Words and dotted/hyphenated runs (CVE-2021-44228, node.js, log4j), optionally prefix-matched with *
+_TERM = re.compile(r"\w+(?:[-.]\w+)*\*?")
+_WORD = re.compile(r"\w+")
+
+_TABLE = {"sqlite": "cve_fts", "postgresql": "cve_search"}
+
+_DELETE = {
+    "sqlite": "DELETE FROM cve_fts WHERE rowid IN :ids",
+    "postgresql": "DELETE FROM cve_search WHERE cve_id IN :ids",
+}
+# Products are "vendor product" pairs with underscores split, so http_server matches "http server"
+_INSERT = {
+    "sqlite": """
+        INSERT INTO cve_fts (rowid, cve_id, summary, products)
+        SELECT CAST(substr(c.id, 5, 4) AS INTEGER) * 100000000 + CAST(substr(c.id, 10) AS INTEGER),
+               c.id, coalesce(c.summary, ''),
+               coalesce((SELECT group_concat(replace(p.vendor || ' ' || p.product, '_', ' '), ' ')
+                         FROM (SELECT DISTINCT vendor, product FROM cve_cpes WHERE cve_id = c.id) p), '')
+        FROM cves c {where}""",
+    "postgresql": """
+        INSERT INTO cve_search (cve_id, document)
+        SELECT c.id,
+               setweight(to_tsvector('simple', c.id), 'A')
+               || setweight(to_tsvector('simple', coalesce((
+                    SELECT string_agg(DISTINCT translate(p.vendor || ' ' || p.product, '_', ' '), ' ')
+                    FROM cve_cpes p WHERE p.cve_id = c.id), '')), 'B')
+               || setweight(to_tsvector('simple', coalesce(c.summary, '')), 'D')
+        FROM cves c {where}""",
+}
+
+_SEARCH = {
+    "sqlite": f"""
+        SELECT * FROM (
+            SELECT c.id, c.summary, c.cvss, c.severity, c.kev, c.published,
+                   bm25(cve_fts, {W_ID}, {W_SUMMARY}, {W_PRODUCTS}) AS score
+            FROM cve_fts JOIN cves c ON c.id = cve_fts.cve_id
+            WHERE cve_fts MATCH :q {{filters}}
+        ) t {{after}}
+        ORDER BY score, id LIMIT :limit""",
+    # ts_rank is higher-is-better; negated so both dialects sort ascending
+    "postgresql": """
+        SELECT * FROM (
+            SELECT c.id, c.summary, c.cvss, c.severity, c.kev, c.published,
+                   -ts_rank(s.document, query) AS score
+            FROM cve_search s JOIN cves c ON c.id = s.cve_id, to_tsquery('simple', :q) query
+            WHERE s.document @@ query {filters}
+        ) t {after}
+        ORDER BY score, id LIMIT :limit""",
+}
+
+_enabled: set[str] = set()
+
+def _rowid(cve_id: str) -> int:
+    # CVE-2021-44228 -> 202100044228; stable across VACUUM, unlike cves.rowid
+    _, year, num = cve_id.split("-", 2)
+    return int(year) * 100000000 + int(num)
+
+def _dialect(db) -> str:
+    return (db.get_bind() if isinstance(db, Session) else db).dialect.name
+
+def enabled(db) -> bool:
+    """Whether the search table exists (a SQLite build without FTS5 has none)."""
+    bind = db.get_bind() if isinstance(db, Session) else db
+    key = str(bind.engine.url)
+    if key not in _enabled:
+        name = _TABLE.get(bind.dialect.name)
+        if not name or not inspect(bind).has_table(name):
+            return False
+        _enabled.add(key)
+    return True
+
+def index_cves(db, cve_ids: Iterable[str] | None = None) -> int:
+    """Rewrite the search rows of cve_ids (every CVE when None); a no-op without a search table."""
+    if not enabled(db):
+        return 0
+    d = _dialect(db)
+    if cve_ids is None:
+        db.execute(text(f"DELETE FROM {_TABLE[d]}"))
+        return db.execute(text(_INSERT[d].format(where=""))).rowcount
+    n = 0
+    for chunk in chunked(cve_ids):
+        ids = bindparam("ids", expanding=True)
+        db.execute(text(_DELETE[d]).bindparams(ids), {"ids": [_rowid(c) for c in chunk] if d == "sqlite" else chunk})
+        n += db.execute(text(_INSERT[d].format(where="WHERE c.id IN :ids")).bindparams(ids), {"ids": chunk}).rowcount
+    return n
+
+def build_query(q: str, dialect: str) -> str:
+    """
+    User text -> MATCH / to_tsquery expression: every term must match, a term of several words
+    (CVE-2021-44228, node.js) as a phrase, a trailing * as a prefix. Raises ValueError if nothing is left.
+    """
+    terms = []
+    for term in _TERM.findall(q):
+        prefix = term.endswith("*")
+        words = _WORD.findall(term)
+        if dialect == "postgresql":
+            terms.append("(" + " <-> ".join(words) + (":*" if prefix else "") + ")")
+        else:
+            terms.append('"' + " ".join(words) + '"' + ("*" if prefix else ""))
+    if not terms:
+        raise ValueError("query has no searchable terms")
+    return (" & " if dialect == "postgresql" else " ").join(terms)
+
+def search(db: Session, q: str, min_cvss: float | None = None, kev: bool | None = None,
+           published_from: datetime | None = None, published_to: datetime | None = None,
+           after: tuple[float, str] | None = None, limit: int = 50) -> list[dict] | None:
+    """Ranked matches, best first, after the (score, id) keyset cursor; None when search is unavailable."""
+    if not enabled(db):
+        return None
+    d = _dialect(db)
+    params: dict = {"q": build_query(q, d), "limit": limit}
+    filters = []
+    if min_cvss is not None:
+        filters.append("c.cvss >= :min_cvss")
+        params["min_cvss"] = min_cvss
+    if kev is not None:
+        filters.append("c.kev = :kev")
+        params["kev"] = kev
+    if published_from is not None:
+        filters.append("c.published >= :published_from")
+        params["published_from"] = published_from
+    if published_to is not None:
+        filters.append("c.published < :published_to")
+        params["published_to"] = published_to
+    where_after = ""
+    if after is not None:
+        where_after = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+        params["after_score"], params["after_id"] = after
+    sql = _SEARCH[d].format(filters="".join(f" AND {f}" for f in filters), after=where_after)
+    stmt = text(sql).bindparams(*(bindparam(k, type_=DateTime) for k in ("published_from", "published_to") if k in params)) \
+        .columns(kev=Boolean, published=DateTime)
+    return [dict(r._mapping) for r in db.execute(stmt, params)]
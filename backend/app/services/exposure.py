@@ -0,0 +1,149 @@
+# backend/app/services/exposure.py
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Iterable
+import yaml
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from ..db import chunked
+from ..models import Asset, Software, Service, VulnFinding
+from .cpe_index import norm, tokens
+
+RULES_DIR = Path(os.getenv("VM_SCOUT_RULES_DIR") or Path(__file__).resolve().parents[3] / "rules") / "windows"
+
+LOOPBACK = ("127.", "::1", "localhost")
+
+def process_key(process: str | None) -> str:
+    p = (process or "").strip().lower()
+    return p[:-4] if p.endswith(".exe") else p
+
+def is_listening_externally(address: str | None) -> bool:
+    # No address recorded means we cannot rule it out
+    return not (address or "").strip().lower().startswith(LOOPBACK)
+
+class ServiceRules:
+    """
+    Listening service -> software needles from rules/windows/*.yml: process names in a dict,
+    banner patterns compiled one by one as written; every pattern that matches adds its needle.
+    """
+
+    def __init__(self, os_processes: Iterable[str], by_process: dict[str, list[str]],
+                 banners: list[tuple[str, str]], digest: str = ""):
+        self.os_processes = frozenset(process_key(p) for p in os_processes)
+        self.by_process = by_process
+        self.banners = [(re.compile(pat, re.I), needle) for pat, needle in banners]
+        self.digest = digest
+
+    def needles(self, process: str | None, banner: str | None) -> list[str]:
+        out = list(self.by_process.get(process_key(process), ()))
+        if banner:
+            out.extend(needle for pat, needle in self.banners if pat.search(banner) is not None)
+        return out
+
+def load_rules(rules_dir: Path = RULES_DIR) -> ServiceRules:
+    os_processes, by_process, banners = [], {}, []
+    digest = hashlib.sha1()
+    for path in sorted(rules_dir.glob("*.yml")) if rules_dir.is_dir() else []:
+        raw = path.read_bytes()
+        digest.update(raw)
+        doc = yaml.safe_load(raw) or {}
+        os_processes.extend(str(p) for p in doc.get("os_processes") or [])
+        for r in doc.get("services") or []:
+            try:
+                needle = norm(str(r["software"]))
+                if "process" in r:
+                    by_process.setdefault(process_key(str(r["process"])), []).append(needle)
+                else:
+                    pat = str(r["banner"])
+                    re.compile(pat)
+                    banners.append((pat, needle))
+            except (KeyError, TypeError, re.error):
+                raise ValueError(f"{path.name}: service rules need software and process or a valid banner: {r!r}")
+    return ServiceRules(os_processes, by_process, banners, digest.hexdigest())
+
+_rules: ServiceRules | None = None
+_rules_lock = threading.Lock()
+
+def get_rules() -> ServiceRules:
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load_rules()
+    return _rules
+
+def reload_rules() -> ServiceRules:
+    global _rules
+    with _rules_lock:
+        _rules = load_rules()
+        return _rules
+
+def exposed(rules: ServiceRules, services, software) -> tuple[set[int], bool]:
+    """
+    (ids of exposed software, whether the OS is exposed) for one asset.
+    services: (local_address, process, banner); software: (id, name).
+    """
+    needles: set[str] = set()
+    words: set[str] = set()
+    os_exposed = False
+    for address, process, banner in services:
+        if not is_listening_externally(address):
+            continue
+        proc = process_key(process)
+        if proc in rules.os_processes:
+            os_exposed = True
+        elif len(proc) >= 3:
+            words.add(proc)
+        needles.update(rules.needles(process, banner))
+    ids = set()
+    if needles or words:
+        for sw_id, name in software:
+            n = norm(name)
+            if any(needle in n for needle in needles) or words & tokens(name):
+                ids.add(sw_id)
+    return ids, os_exposed
+
+def refresh(db: Session, asset_ids: Iterable[int]) -> int:
+    """
+    Recompute exposure for assets and store it on their software, the asset (OS) and existing findings.
+    New findings take it from there when they are written. Returns the number of assets that changed.
+    """
+    rules = get_rules()
+    changed = 0
+    for chunk in chunked(asset_ids):
+        services: dict[int, list] = {aid: [] for aid in chunk}
+        for aid, *row in db.execute(select(Service.asset_id, Service.local_address, Service.process, Service.banner)
+                                    .where(Service.asset_id.in_(chunk))):
+            services[aid].append(row)
+        software: dict[int, list] = {aid: [] for aid in chunk}
+        current: dict[int, set[int]] = {aid: set() for aid in chunk}
+        for sw_id, aid, name, is_exposed in db.execute(
+                select(Software.id, Software.asset_id, Software.name, Software.exposed).where(Software.asset_id.in_(chunk))):
+            software[aid].append((sw_id, name))
+            if is_exposed:
+                current[aid].add(sw_id)
+        os_current = dict(db.execute(select(Asset.id, Asset.os_exposed).where(Asset.id.in_(chunk))).all())
+
+        for aid in chunk:
+            if aid not in os_current:
+                continue
+            ids, os_exposed = exposed(rules, services[aid], software[aid])
+            if ids == current[aid] and os_exposed == bool(os_current[aid]):
+                continue
+            changed += 1
+            db.execute(update(Software).where(Software.asset_id == aid).values(exposed=Software.id.in_(sorted(ids))))
+            db.execute(update(Asset).where(Asset.id == aid).values(os_exposed=os_exposed))
+            db.execute(update(VulnFinding).where(VulnFinding.asset_id == aid, VulnFinding.software_id.is_not(None))
+                       .values(exposed=VulnFinding.software_id.in_(sorted(ids))))
+            db.execute(update(VulnFinding).where(VulnFinding.asset_id == aid, VulnFinding.software_id.is_(None))
+                       .values(exposed=os_exposed))
+    return changed
+
+def refresh_all(db: Session) -> int:
+    """refresh() for every asset, e.g. after the rules changed, and commit."""
+    n = refresh(db, db.execute(select(Asset.id)).scalars().all())
+    db.commit()
+    return n
@@ -1,30 +1,64 @@
 import httpx
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from ..models import CVE
-from datetime import datetime
+from ..db import chunked, upsert
+from .. import metrics
+from ..models import CVE, VulnFinding
+from .feed_state import get_state, set_state
+from . import cve_search, rollups
 
 KEV_URL = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json"
 
-def update_kev(db: Session) -> int:
-    r = httpx.get(KEV_URL, timeout=60.0)
+def _set_kev(db: Session, ids, flag: bool):
+    for chunk in chunked(ids):
+        db.execute(update(CVE).where(CVE.id.in_(chunk)).values(kev=flag))
+        # Keep the denormalized copy on findings in step without a re-match
+        db.execute(update(VulnFinding).where(VulnFinding.cve_id.in_(chunk)).values(kev=flag))
+
+def apply_kev_set(db: Session, kev_ids: set[str]) -> dict:
+    current = set(db.execute(select(CVE.id).where(CVE.kev.is_(True))).scalars())
+    marked = kev_ids - current
+    cleared = current - kev_ids
+    if marked:
+        known = {c for chunk in chunked(marked) for c in db.execute(select(CVE.id).where(CVE.id.in_(chunk))).scalars()}
+        new = marked - known
+        if new:
+            # Create minimal CVEs with the KEV flag; details can be filled by NVD later.
+            # Index them now so search finds them by id before NVD has them
+            stmt = upsert(db, CVE).on_conflict_do_nothing(index_elements=[CVE.id])
+            db.execute(stmt, [{"id": c, "kev": True} for c in new])
+            cve_search.index_cves(db, new)
+        _set_kev(db, marked, True)
+    if cleared:
+        _set_kev(db, cleared, False)
+    if marked or cleared:
+        rollups.refresh(db, *rollups.affected_by_cves(db, marked | cleared))
+    metrics.KEV_CHANGES.inc(len(marked), change="marked")
+    metrics.KEV_CHANGES.inc(len(cleared), change="cleared")
+    return {"marked": len(marked), "cleared": len(cleared)}
+
+def update_kev(db: Session) -> dict:
+    """Conditional fetch (ETag / Last-Modified); an unchanged catalog costs one 304."""
+    headers = {}
+    etag = get_state(db, "kev.etag")
+    last_mod = get_state(db, "kev.last_modified")
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_mod:
+        headers["If-Modified-Since"] = last_mod
+    r = httpx.get(KEV_URL, timeout=60.0, headers=headers)
+    if r.status_code == 304:
+        metrics.KEV_FETCHES.inc(result="not_modified")
+        return {"marked": 0, "cleared": 0, "not_modified": True}
     r.raise_for_status()
+    metrics.KEV_FETCHES.inc(result="updated")
     data = r.json()
-    items = data.get("vulnerabilities", [])
-    count = 0
-    kev_ids = set()
-    for it in items:
-        cve = it.get("cveID")
-        if not cve: 
-            continue
-        kev_ids.add(cve)
-        row = db.get(CVE, cve)
-        if row:
-            if not row.kev:
-                row.kev = True
-                count += 1
-        else:
-            # Create minimal CVE with KEV flag; details can be filled by NVD later
-            db.add(CVE(id=cve, summary=None, cvss=None, severity=None, published=None, kev=True))
-            count += 1
+    kev_ids = {it["cveID"] for it in data.get("vulnerabilities", []) if it.get("cveID")}
+    if not kev_ids:
+        # Never let a truncated/empty download clear every KEV flag
+        raise ValueError("KEV catalog contained no CVE ids")
+    res = apply_kev_set(db, kev_ids)
+    set_state(db, "kev.etag", r.headers.get("ETag"))
+    set_state(db, "kev.last_modified", r.headers.get("Last-Modified"))
     db.commit()
-    return count
+    return {**res, "not_modified": False}
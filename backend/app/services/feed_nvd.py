@@ -1,15 +1,42 @@
 # backend/app/services/feed_nvd.py
+import asyncio
+import glob
+import gzip
+import io
+import json
 import os
+import random
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Tuple, Iterable
+from typing import Tuple, Iterable, Iterator
 import httpx
 from sqlalchemy.orm import Session
-from sqlalchemy import delete
+from sqlalchemy import delete, insert
+from ..db import chunked, upsert
+from .. import metrics
 from ..models import CVE, CVECPE
+from .cpe_index import bump_generation, refresh_index
+from .os_match import refresh_os_index
+from .feed_state import get_state, set_state, get_checkpoint, clear_checkpoints
+from . import changes, cve_search
 
 NVD_API = "https://services.nvd.nist.gov/rest/json/cves/2.0"
 DEFAULT_WINDOW_DAYS = 90
 FALLBACK_WINDOW_DAYS = 30
+DELTA_MAX_DAYS = 120  # NVD caps lastMod ranges at 120 days
+PAGE_SIZE = 2000
+PREFETCH_PAGES = 3
+MAX_RETRIES = 6
+BACKOFF_BASE_S = 2.0
+RETRY_STATUS = {403, 429, 503}
+RATE_WINDOW_S = 30.0
+RATE_NO_KEY = 5
+RATE_WITH_KEY = 50
+IMPORT_PAGE_SIZE = 2000
+READ_CHUNK = 1 << 20
 
 def _parse_cvss(v) -> Tuple[float | None, str | None]:
     try:
@@ -23,8 +50,10 @@ def _parse_cvss(v) -> Tuple[float | None, str | None]:
     return None, None
 
 def _iter_cpes(conf) -> Iterable[Tuple[str, dict]]:
+    # API 2.0 returns a list of configurations; older payloads a single {"nodes": [...]}
+    confs = conf if isinstance(conf, list) else [conf]
     try:
-        for node in conf.get("nodes", []):
+        for node in (n for c in confs for n in (c or {}).get("nodes", [])):
             for cm in node.get("cpeMatch", []):
                 cpe = cm.get("criteria") or cm.get("cpe23Uri")
                 if not cpe:
@@ -45,105 +74,333 @@ def _split_cpe(cpe23: str):
     product = parts[4] if len(parts) > 5 else None
     return vendor, product
 
-def _fetch_window(db: Session, client: httpx.Client, start_dt: datetime, end_dt: datetime) -> int:
-    pub_start = start_dt.strftime("%Y-%m-%dT00:00:00.000+00:00")
-    pub_end   = end_dt.strftime("%Y-%m-%dT23:59:59.999+00:00")
-    print(f"[NVD] window {pub_start} -> {pub_end}")
-    params = {"pubStartDate": pub_start, "pubEndDate": pub_end}
-    upserted = 0
-    start_idx = 0
+def _refresh_indexes(db: Session):
+    # Both are built from cve_cpes; rebuild them in this process right away rather than on the next lookup
+    refresh_index(db)
+    refresh_os_index(db)
 
-    while True:
-        resp = client.get(NVD_API, params={**params, "startIndex": start_idx})
-        resp.raise_for_status()
-        data = resp.json()
-        vulns = data.get("vulnerabilities", [])
-        if not vulns:
-            break
+def _parse_vuln(v) -> Tuple[dict, list[dict]]:
+    cve_id = v["cve"]["id"]
+    descs = v["cve"].get("descriptions", [])
+    summary = next((d["value"] for d in descs if d.get("lang") == "en"), None)
+    score, sev = _parse_cvss(v)
+    pub = v["cve"].get("published")
+    pub_dt = None
+    if pub:
+        try:
+            pub_dt = datetime.fromisoformat(pub.replace("Z", "+00:00"))
+        except Exception:
+            pass
+    cve = {"id": cve_id, "summary": summary, "cvss": score, "severity": sev, "published": pub_dt}
+
+    cpes = []
+    conf = v["cve"].get("configurations") or []
+    for cpe23, rng in _iter_cpes(conf):
+        vendor, product = _split_cpe(cpe23)
+        cpes.append({"cve_id": cve_id, "cpe23": cpe23, "vendor": vendor, "product": product, **rng})
+    return cve, cpes
+
+def _apply_page(db: Session, vulns: list[dict]) -> int:
+    """
+    Set-based write of one page: upsert cves (kev is left alone), then replace
+    cve_cpes for every CVE on the page with one delete and one executemany insert.
+    """
+    cves: dict[str, dict] = {}
+    cpes: dict[str, list[dict]] = {}
+    for v in vulns:
+        cve, rows = _parse_vuln(v)
+        cves[cve["id"]] = cve
+        cpes[cve["id"]] = rows  # last occurrence wins, as with row-by-row replacement
+    if not cves:
+        return 0
+
+    stmt = upsert(db, CVE)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CVE.id],
+        set_={c: stmt.excluded[c] for c in ("summary", "cvss", "severity", "published")},
+    )
+    db.execute(stmt, list(cves.values()))
+    for chunk in chunked(cves):
+        db.execute(delete(CVECPE).where(CVECPE.cve_id.in_(chunk)))
+    cpe_rows = [r for rows in cpes.values() for r in rows]
+    if cpe_rows:
+        db.execute(insert(CVECPE), cpe_rows)
+    bump_generation(db)
+
+    cve_search.index_cves(db, cves)
+    changes.record_cves(db, cves)
+    changes.record_products(db, {(r["vendor"], r["product"]) for r in cpe_rows})
+    metrics.CVES_UPSERTED.inc(len(cves), feed="nvd")
+    metrics.CPE_ROWS.inc(len(cpe_rows))
+    return len(cves)
+
+def _commit_page(db: Session, window: str, vulns: list[dict], next_index: int, total: int, done: bool) -> int:
+    n = _apply_page(db, vulns)
+    cp = get_checkpoint(db, "nvd", window)
+    cp.next_index, cp.total, cp.done = next_index, total, done
+    db.commit()
+    return n
+
+def _load_checkpoint(db: Session, window: str) -> tuple[int, bool]:
+    cp = get_checkpoint(db, "nvd", window)
+    db.commit()
+    return cp.next_index, cp.done
+
+class RateLimiter:
+    """Sliding-window limiter: at most `max_calls` request starts per `period` seconds."""
+
+    def __init__(self, max_calls: int, period: float):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls: deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                await asyncio.sleep(self.period - (now - self._calls[0]))
+
+class _Fetcher:
+    """
+    One refresh run: async page downloads behind the rate limiter, DB writes on a single
+    writer thread so the next pages download while the current one is committed.
+    """
+
+    def __init__(self, db: Session, client: httpx.AsyncClient, limiter: RateLimiter, api_url: str):
+        self.db = db
+        self.client = client
+        self.limiter = limiter
+        self.api_url = api_url
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nvd-writer")
+
+    async def db_call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.writer, fn, self.db, *args)
+
+    async def get_page(self, params: dict, start_idx: int) -> dict:
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            try:
+                resp = await self.client.get(self.api_url, params={**params, "startIndex": start_idx, "resultsPerPage": PAGE_SIZE})
+            except httpx.TransportError:
+                if attempt == MAX_RETRIES:
+                    raise
+                metrics.NVD_RETRIES.inc(reason="transport")
+                await asyncio.sleep(_backoff(attempt))
+                continue
+            if resp.status_code in RETRY_STATUS and attempt < MAX_RETRIES:
+                retry_after = resp.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else _backoff(attempt)
+                print(f"[NVD] HTTP {resp.status_code} at startIndex={start_idx}, retry in {delay:.1f}s")
+                metrics.NVD_RETRIES.inc(reason=str(resp.status_code))
+                await asyncio.sleep(delay)
+                continue
+            resp.raise_for_status()
+            metrics.NVD_PAGES.inc()
+            return resp.json()
+        raise RuntimeError("unreachable")
 
-        for v in vulns:
-            cve_id = v["cve"]["id"]
-            descs = v["cve"].get("descriptions", [])
-            summary = next((d["value"] for d in descs if d.get("lang") == "en"), None)
-            score, sev = _parse_cvss(v)
-            pub = v["cve"].get("published")
-            pub_dt = None
-            if pub:
-                try:
-                    pub_dt = datetime.fromisoformat(pub.replace("Z", "+00:00"))
-                except Exception:
-                    pass
-
-            row = db.get(CVE, cve_id)
-            if not row:
-                row = CVE(id=cve_id)
-                db.add(row)
-            row.summary = summary
-            row.cvss = score
-            row.severity = sev
-            row.published = pub_dt
-
-            # Replace CPEs for this CVE
-            db.flush()
-            db.execute(delete(CVECPE).where(CVECPE.cve_id == cve_id))
-            conf = v["cve"].get("configurations", {}) or {}
-            for cpe23, rng in _iter_cpes(conf):
-                vendor, product = _split_cpe(cpe23)
-                db.add(CVECPE(
-                    cve_id=cve_id,
-                    cpe23=cpe23,
-                    vendor=vendor,
-                    product=product,
-                    vers_start_incl=rng["vers_start_incl"],
-                    vers_start_excl=rng["vers_start_excl"],
-                    vers_end_incl=rng["vers_end_incl"],
-                    vers_end_excl=rng["vers_end_excl"],
-                ))
-            upserted += 1
-
-        db.commit()
+    async def sync_window(self, window: str, params: dict) -> int:
+        start, done = await self.db_call(_load_checkpoint, window)
+        if done:
+            print(f"[NVD] {window} already done, skipping")
+            return 0
+        print(f"[NVD] {window} from startIndex={start}")
+        data = await self.get_page(params, start)
         total = data.get("totalResults", 0)
-        start_idx += len(vulns)
-        if start_idx >= total:
-            break
+        per_page = data.get("resultsPerPage") or PAGE_SIZE
+        upcoming = iter(range(start + per_page, total, per_page))
+        inflight: deque[asyncio.Task] = deque()
+        idx, upserted = start, 0
+        try:
+            while True:
+                # Keep PREFETCH_PAGES downloads running while this page is written
+                while len(inflight) < PREFETCH_PAGES and (n := next(upcoming, None)) is not None:
+                    inflight.append(asyncio.create_task(self.get_page(params, n)))
+                vulns = data.get("vulnerabilities", [])
+                idx += len(vulns)
+                last = not inflight or not vulns
+                upserted += await self.db_call(_commit_page, window, vulns, idx, total, last)
+                if last:
+                    return upserted
+                data = await inflight.popleft()
+        finally:
+            for t in inflight:
+                t.cancel()
+
+def _backoff(attempt: int) -> float:
+    return BACKOFF_BASE_S * (2 ** attempt) + random.uniform(0, 1)
+
+def _fmt(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000+00:00")
+
+def _spans(start_dt: datetime, end_dt: datetime, days: int) -> list[tuple[datetime, datetime]]:
+    out, cur = [], start_dt
+    while cur < end_dt:
+        nxt = min(cur + timedelta(days=days), end_dt)
+        out.append((cur, nxt))
+        cur = nxt
+    return out
 
-    return upserted
+# --- Offline import from NVD JSON 2.0 bulk data files (nvdcve-2.0-*.json[.gz|.zip]) ---
 
-def update_nvd(db: Session, days: int = 30) -> int:
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zip"):
+        zf = zipfile.ZipFile(path)
+        member = next(n for n in zf.namelist() if n.endswith(".json"))
+        return io.TextIOWrapper(zf.open(member), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_feed_vulnerabilities(fp: io.TextIOBase, key: str = "vulnerabilities") -> Iterator[dict]:
     """
-    Chunk the requested range into windows to avoid NVD 404 on large spans.
+    Yield the items of the top-level `key` array one at a time.
+    Memory is bounded by READ_CHUNK plus the largest single item, not the file size.
     """
-    # Build client with optional API key (improves quotas)
-    print(f"[NVD] update_nvd(days={days}) chunk={DEFAULT_WINDOW_DAYS}")
+    dec = json.JSONDecoder()
+    marker = f'"{key}"'
+    buf = ""
+    while True:
+        i = buf.find(marker)
+        j = buf.find("[", i) if i >= 0 else -1
+        if j >= 0:
+            pos = j + 1
+            break
+        data = fp.read(READ_CHUNK)
+        if not data:
+            return
+        buf = (buf if i >= 0 else buf[-len(marker):]) + data
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            data = fp.read(READ_CHUNK)
+            if not data:
+                return
+            buf, pos = data, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            obj, end = dec.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Item spans the chunk boundary
+            data = fp.read(READ_CHUNK)
+            if not data:
+                raise
+            buf, pos = buf[pos:] + data, 0
+            continue
+        yield obj
+        pos = end
+        if pos > READ_CHUNK:
+            buf, pos = buf[pos:], 0
+
+def import_nvd_files(db: Session, paths: Iterable[str], page_size: int = IMPORT_PAGE_SIZE) -> int:
+    total = 0
+    for path in paths:
+        print(f"[NVD] import {path}")
+        page: list[dict] = []
+        with _open_text(path) as fp:
+            for v in iter_feed_vulnerabilities(fp):
+                page.append(v)
+                if len(page) >= page_size:
+                    total += _apply_page(db, page)
+                    db.commit()
+                    page = []
+        if page:
+            total += _apply_page(db, page)
+            db.commit()
+    _refresh_indexes(db)
+    return total
+
+def feed_files(directory: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(directory, "nvdcve-2.0-*.json*")))
+
+def _day_windows(start_dt: datetime, end_dt: datetime, days: int) -> list[tuple[datetime, datetime]]:
+    # Published windows are whole days, so a rerun on the same day lines up with saved checkpoints
+    out, cur = [], start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_day = end_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    while cur <= end_day:
+        last = min(cur + timedelta(days=days - 1), end_day)
+        out.append((cur, last.replace(hour=23, minute=59, second=59)))
+        cur = last + timedelta(days=1)
+    return out
+
+async def _sync_published(f: _Fetcher, start_dt: datetime, end_dt: datetime, window_days: int) -> int:
+    total = 0
+    for w_start, w_end in _day_windows(start_dt, end_dt, window_days):
+        params = {"pubStartDate": _fmt(w_start), "pubEndDate": w_end.strftime("%Y-%m-%dT%H:%M:%S.999+00:00")}
+        try:
+            total += await f.sync_window(f"pub:{w_start:%Y-%m-%d}/{w_end:%Y-%m-%d}", params)
+        except httpx.HTTPStatusError as e:
+            # If window too large yields 404, retry with smaller fallback window
+            if e.response is not None and e.response.status_code == 404 and window_days > FALLBACK_WINDOW_DAYS:
+                total += await _sync_published(f, w_start, w_end, FALLBACK_WINDOW_DAYS)
+            else:
+                raise
+    return total
+
+async def _sync_delta(f: _Fetcher, since: datetime, until: datetime) -> int:
+    total = 0
+    for w_start, w_end in _spans(since, until, DELTA_MAX_DAYS):
+        params = {"lastModStartDate": _fmt(w_start), "lastModEndDate": _fmt(w_end)}
+        total += await f.sync_window(f"mod:{_fmt(w_start)}/{_fmt(w_end)}", params)
+    return total
+
+async def _update_nvd(db: Session, days: int, mode: str) -> int:
     headers = {"User-Agent": "vm-scout/0.2"}
     api_key = os.getenv("NVD_API_KEY")
     if api_key:
         headers["apiKey"] = api_key
+    # NVD public limits: 5 requests / 30 s without a key, 50 / 30 s with one
+    rate = int(os.getenv("NVD_RATE_LIMIT") or (RATE_WITH_KEY if api_key else RATE_NO_KEY))
+    limiter = RateLimiter(rate, float(os.getenv("NVD_RATE_WINDOW_S", RATE_WINDOW_S)))
+    api_url = os.getenv("NVD_API_URL", NVD_API)
 
     now = datetime.utcnow()
-    start_dt = now - timedelta(days=days)
-    end_dt = now
+    async with httpx.AsyncClient(timeout=60.0, headers=headers) as client:
+        f = _Fetcher(db, client, limiter, api_url)
+        try:
+            if mode == "delta":
+                last = await f.db_call(lambda d: get_state(d, "nvd.last_sync"))
+                pending = await f.db_call(lambda d: get_state(d, "nvd.delta_until"))
+                since = datetime.fromisoformat(last) if last else now - timedelta(days=days)
+                # Reuse the end of an interrupted run so its window checkpoints still match
+                until = datetime.fromisoformat(pending) if pending else now
+                await f.db_call(_set_states, {"nvd.delta_until": until.isoformat()})
+                print(f"[NVD] delta sync {since.isoformat()} -> {until.isoformat()}")
+                total = await _sync_delta(f, since, until)
+                await f.db_call(_finish_run, {"nvd.last_sync": until.isoformat(), "nvd.delta_until": None})
+            else:
+                window_days = min(DEFAULT_WINDOW_DAYS, max(1, days))
+                print(f"[NVD] update_nvd(days={days}) chunk={window_days}")
+                total = await _sync_published(f, now - timedelta(days=days), now, window_days)
+                await f.db_call(_finish_run, {})
+            await f.db_call(_refresh_indexes)
+        finally:
+            f.writer.shutdown(wait=True)
+    return total
 
-    window_days = min(DEFAULT_WINDOW_DAYS, max(1, days))
-    upsert_total = 0
+def _set_states(db: Session, values: dict):
+    for k, v in values.items():
+        set_state(db, k, v)
+    db.commit()
 
-    with httpx.Client(timeout=60.0, headers=headers) as client:
-        cur_start = start_dt
-        while cur_start <= end_dt:
-            cur_end = min(cur_start + timedelta(days=window_days - 1), end_dt)
-            try:
-                upsert_total += _fetch_window(db, client, cur_start, cur_end)
-            except httpx.HTTPStatusError as e:
-                # If window too large yields 404, retry with smaller fallback window
-                if e.response is not None and e.response.status_code == 404 and window_days > FALLBACK_WINDOW_DAYS:
-                    # Retry in smaller chunks
-                    small_start = cur_start
-                    while small_start <= cur_end:
-                        small_end = min(small_start + timedelta(days=FALLBACK_WINDOW_DAYS - 1), cur_end)
-                        upsert_total += _fetch_window(db, client, small_start, small_end)
-                        small_start = small_end + timedelta(days=1)
-                else:
-                    raise
-            cur_start = cur_end + timedelta(days=1)
+def _finish_run(db: Session, values: dict):
+    clear_checkpoints(db, "nvd")
+    _set_states(db, values)
 
-    return upsert_total
+def update_nvd(db: Session, days: int = 30, mode: str = "published") -> int:
+    """
+    mode=published: CVEs published in the last `days`, in windows to avoid NVD 404 on large spans.
+    mode=delta: CVEs modified since the last successful delta run (or the last `days` on first run).
+    Progress is checkpointed per window/startIndex; a rerun after a failure resumes where it stopped.
+    """
+    return asyncio.run(_update_nvd(db, days, mode))
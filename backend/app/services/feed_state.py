@@ -0,0 +1,28 @@
+# backend/app/services/feed_state.py
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from ..models import FeedState, FeedCheckpoint
+
+def get_state(db: Session, key: str) -> str | None:
+    row = db.get(FeedState, key)
+    return row.value if row else None
+
+def set_state(db: Session, key: str, value: str | None):
+    row = db.get(FeedState, key)
+    if row:
+        row.value = value
+    else:
+        db.add(FeedState(key=key, value=value))
+
+def get_checkpoint(db: Session, feed: str, window: str) -> FeedCheckpoint:
+    cp = db.execute(
+        select(FeedCheckpoint).where(FeedCheckpoint.feed == feed, FeedCheckpoint.window == window)
+    ).scalar_one_or_none()
+    if not cp:
+        cp = FeedCheckpoint(feed=feed, window=window, next_index=0, done=False)
+        db.add(cp)
+        db.flush()
+    return cp
+
+def clear_checkpoints(db: Session, feed: str):
+    db.execute(delete(FeedCheckpoint).where(FeedCheckpoint.feed == feed))
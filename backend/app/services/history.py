@@ -0,0 +1,178 @@
+# backend/app/services/history.py
+"""
+Findings history. vuln_findings is rewritten by every match, so after each write sync() diffs the
+assets' current findings against finding_state (one row per (asset, product, cve) key ever seen)
+and appends an open or close event to finding_events for every key that changed side. Storage
+grows with the number of transitions, not with runs x findings.
+
+Findings are keyed by the CPE product rather than the software row, so an upgrade that leaves the
+host vulnerable keeps the finding open instead of closing and reopening it.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable
+from sqlalchemy import select, insert, update, func, and_
+from sqlalchemy.orm import Session, aliased
+from ..db import chunked
+from ..models import Asset, VulnFinding, FindingEvent, FindingState
+
+OPEN, CLOSE = "open", "close"
+
+Key = tuple[int, str, str]  # asset_id, product ("" when unknown), cve_id
+
+def _open_events(db: Session, rows: list[dict]) -> list[int]:
+    """Insert open events and return their ids in row order."""
+    if not rows:
+        return []
+    # INSERT .. RETURNING in parameter order runs row by row on SQLite; read the new ids back by key instead
+    last = db.scalar(select(func.max(FindingEvent.id))) or 0
+    db.connection().execute(insert(FindingEvent.__table__), rows)
+    q = select(FindingEvent.id, FindingEvent.asset_id, FindingEvent.product, FindingEvent.cve_id) \
+        .where(FindingEvent.id > last, FindingEvent.kind == OPEN)
+    ids = {(aid, prod, cve_id): event_id for event_id, aid, prod, cve_id in db.connection().execute(q)}
+    return [ids[(r["asset_id"], r["product"], r["cve_id"])] for r in rows]
+
+def sync(db: Session, asset_ids: Iterable[int] | None = None, now: datetime | None = None,
+         backfill: bool = False) -> tuple[int, int]:
+    """
+    Record transitions for asset_ids (every asset when None) after their findings were written.
+    Returns (opened, closed). With backfill, new keys are opened at the finding's created_at.
+    """
+    now = now or datetime.utcnow()
+    if asset_ids is None:
+        asset_ids = db.execute(select(Asset.id)).scalars().all()
+    # Core rows and inserts: no ORM bookkeeping per finding, which dominates on a large fleet
+    conn = db.connection()
+    opened = closed = 0
+    for chunk in chunked(asset_ids):
+        current = {(aid, prod or "", cve_id) for aid, prod, cve_id in conn.execute(
+            select(VulnFinding.asset_id, VulnFinding.product, VulnFinding.cve_id).where(VulnFinding.asset_id.in_(chunk)))}
+        open_states: dict[Key, tuple] = {}
+        q = select(FindingState.asset_id, FindingState.product, FindingState.cve_id, FindingState.id,
+                   FindingState.open_id, FindingState.opened_at) \
+            .where(FindingState.asset_id.in_(chunk), FindingState.closed_at.is_(None))
+        for aid, prod, cve_id, *rest in conn.execute(q):
+            open_states[(aid, prod, cve_id)] = rest
+
+        to_open = sorted(k for k in current if k not in open_states)
+        to_close = sorted(k for k in open_states if k not in current)
+
+        details: dict[Key, tuple] = {}
+        closed_states: dict[Key, tuple] = {}
+        wanted = set(to_open)
+        for assets in chunked({k[0] for k in to_open}):
+            q = select(VulnFinding.asset_id, VulnFinding.product, VulnFinding.cve_id, VulnFinding.software_id,
+                       VulnFinding.severity, VulnFinding.cvss, VulnFinding.kev, VulnFinding.created_at) \
+                .where(VulnFinding.asset_id.in_(assets)).order_by(VulnFinding.id)
+            for aid, prod, cve_id, *rest in conn.execute(q):
+                details.setdefault((aid, prod or "", cve_id), rest)
+            q = select(FindingState.asset_id, FindingState.product, FindingState.cve_id, FindingState.id,
+                       FindingState.reopened) \
+                .where(FindingState.asset_id.in_(assets), FindingState.closed_at.is_not(None))
+            for aid, prod, cve_id, *rest in conn.execute(q):
+                if (aid, prod, cve_id) in wanted:
+                    closed_states[(aid, prod, cve_id)] = rest
+
+        events = []
+        for k in to_open:
+            sw_id, sev, cvss, kev, created = details[k]
+            at = created if backfill and created else now
+            events.append({"kind": OPEN, "at": at, "asset_id": k[0], "product": k[1], "cve_id": k[2],
+                           "software_id": sw_id, "severity": sev, "cvss": cvss, "kev": bool(kev)})
+        new_states, reopened = [], []
+        for k, ev, event_id in zip(to_open, events, _open_events(db, events)):
+            s = closed_states.get(k)
+            if s is None:
+                new_states.append({"asset_id": k[0], "product": k[1], "cve_id": k[2], "open_id": event_id,
+                                   "first_seen": ev["at"], "opened_at": ev["at"], "closed_at": None, "reopened": 0})
+            else:
+                reopened.append({"id": s[0], "open_id": event_id, "opened_at": ev["at"], "closed_at": None,
+                                 "reopened": s[1] + 1})
+        if new_states:
+            conn.execute(insert(FindingState.__table__), new_states)
+        if reopened:
+            db.execute(update(FindingState), reopened)
+
+        if to_close:
+            opens = {}
+            for ids in chunked([open_states[k][1] for k in to_close]):
+                q = select(FindingEvent.id, FindingEvent.software_id, FindingEvent.severity, FindingEvent.cvss,
+                           FindingEvent.kev).where(FindingEvent.id.in_(ids))
+                opens.update({r[0]: r[1:] for r in conn.execute(q)})
+            rows = []
+            for k in to_close:
+                state_id, open_id, opened_at = open_states[k]
+                sw_id, sev, cvss, kev = opens.get(open_id, (None, None, None, False))
+                rows.append({"kind": CLOSE, "at": now, "asset_id": k[0], "product": k[1], "cve_id": k[2],
+                             "software_id": sw_id, "severity": sev, "cvss": cvss, "kev": bool(kev), "open_id": open_id,
+                             "age_s": max(0, int((now - opened_at).total_seconds()))})
+            conn.execute(insert(FindingEvent.__table__), rows)
+            db.execute(update(FindingState), [{"id": open_states[k][0], "closed_at": now} for k in to_close])
+        opened += len(to_open)
+        closed += len(to_close)
+    return opened, closed
+
+# ---------------- Queries ----------------
+
+def _open_as_of(at: datetime):
+    """Open events at or before `at` that no close at or before `at` ended: the findings open at that moment."""
+    c = aliased(FindingEvent)
+    return select(FindingEvent) \
+        .outerjoin(c, and_(c.open_id == FindingEvent.id, c.at <= at)) \
+        .where(FindingEvent.kind == OPEN, FindingEvent.at <= at, c.id.is_(None))
+
+def as_of(db: Session, at: datetime, asset_id: int | None = None, severity: str | None = None,
+          kev: bool | None = None, before_id: int | None = None, limit: int = 500) -> list[FindingEvent]:
+    q = _open_as_of(at)
+    if asset_id:
+        q = q.where(FindingEvent.asset_id == asset_id)
+    if severity:
+        q = q.where(FindingEvent.severity == severity.upper())
+    if kev is not None:
+        q = q.where(FindingEvent.kev.is_(kev))
+    if before_id:
+        q = q.where(FindingEvent.id < before_id)
+    return db.execute(q.order_by(FindingEvent.id.desc()).limit(limit)).scalars().all()
+
+def mttr(db: Session, since: datetime, until: datetime, kev: bool | None = None) -> dict:
+    """Mean/median time to remediate of findings closed in [since, until), overall and per severity."""
+    q = select(FindingEvent.severity, FindingEvent.age_s) \
+        .where(FindingEvent.kind == CLOSE, FindingEvent.at >= since, FindingEvent.at < until)
+    if kev is not None:
+        q = q.where(FindingEvent.kev.is_(kev))
+    ages: dict[str, list[int]] = {}
+    for sev, age in db.execute(q):
+        ages.setdefault((sev or "UNKNOWN").upper(), []).append(age or 0)
+
+    def stats(values: list[int]) -> dict:
+        values = sorted(values)
+        if not values:
+            return {"closed": 0, "mean_days": None, "median_days": None}
+        return {"closed": len(values), "mean_days": round(sum(values) / len(values) / 86400, 2),
+                "median_days": round(values[len(values) // 2] / 86400, 2)}
+
+    return {"since": since, "until": until, **stats([a for v in ages.values() for a in v]),
+            "by_severity": {sev: stats(v) for sev, v in sorted(ages.items())}}
+
+def trend(db: Session, since: datetime, until: datetime, bucket_days: int = 1) -> list[dict]:
+    """Findings opened, closed and open at the end of each bucket from since to until."""
+    open_before = db.scalar(select(func.count()).select_from(_open_as_of(since - timedelta(microseconds=1)).subquery())) or 0
+    day = func.date(FindingEvent.at)
+    q = select(day, FindingEvent.kind, func.count()) \
+        .where(FindingEvent.at >= since, FindingEvent.at < until).group_by(day, FindingEvent.kind)
+    per_day: dict[str, dict[str, int]] = {}
+    for d, kind, n in db.execute(q):
+        per_day.setdefault(str(d), {})[kind] = n
+    out, cur, open_now = [], since, open_before
+    while cur < until:
+        end = min(cur + timedelta(days=bucket_days), until)
+        opened = closed = 0
+        d = cur
+        while d < end:
+            counts = per_day.get(d.date().isoformat(), {})
+            opened += counts.get(OPEN, 0)
+            closed += counts.get(CLOSE, 0)
+            d += timedelta(days=1)
+        open_now += opened - closed
+        out.append({"start": cur.date().isoformat(), "opened": opened, "closed": closed, "open": open_now})
+        cur = end
+    return out
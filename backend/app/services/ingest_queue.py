@@ -0,0 +1,118 @@
+# backend/app/services/ingest_queue.py
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from ..schemas import InventoryPayload
+from .inventory import apply_batch
+
+QUEUE_MAX = int(os.getenv("VM_SCOUT_INGEST_QUEUE_MAX", "1000"))
+COALESCE_MAX = int(os.getenv("VM_SCOUT_INGEST_COALESCE", "200"))  # payloads per writer transaction
+JOBS_KEEP = 10000
+
+@dataclass
+class Job:
+    id: str
+    hostname: str
+    status: str = "queued"  # queued | running | done | error
+    enqueued_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict | None = None
+    error: str | None = None
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id, "hostname": self.hostname, "status": self.status,
+            "enqueued_at": self.enqueued_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "result": self.result, "error": self.error,
+        }
+
+class IngestQueue:
+    """
+    Bounded in-process queue drained by a single writer thread, which coalesces
+    queued payloads into one transaction. Queued work does not survive a restart.
+    """
+
+    def __init__(self, maxsize: int = QUEUE_MAX, coalesce: int = COALESCE_MAX):
+        self._q: queue.Queue = queue.Queue(maxsize)
+        self._coalesce = coalesce
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_lag_s = 0.0
+
+    def submit(self, payload: InventoryPayload) -> Job:
+        """Raises queue.Full when the queue is at capacity."""
+        job = Job(id=uuid.uuid4().hex, hostname=payload.hostname)
+        self._q.put_nowait((job, payload))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOBS_KEEP:
+                self._jobs.popitem(last=False)
+        self._ensure_worker()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            items = [self._q.get()]
+            while len(items) < self._coalesce:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            now = time.time()
+            for job, _ in items:
+                job.status, job.started_at = "running", now
+            self.last_lag_s = now - items[0][0].enqueued_at
+            try:
+                results = apply_batch([p for _, p in items])
+            except Exception as e:  # commit failed: the whole batch is lost
+                results = [{"status": "error", "error": str(e)}] * len(items)
+            done = time.time()
+            for (job, _), res in zip(items, results):
+                job.finished_at = done
+                if res.get("status") == "ingested":
+                    job.status, job.result = "done", res
+                    self.processed += 1
+                else:
+                    job.status, job.error = "error", res.get("error")
+                    self.failed += 1
+            self.batches += 1
+            self.last_batch_size = len(items)
+            for _ in items:
+                self._q.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            oldest = next((j.enqueued_at for j in self._jobs.values() if j.status == "queued"), None)
+        return {
+            "depth": self._q.qsize(),
+            "max_depth": self._q.maxsize,
+            "lag_s": round(time.time() - oldest, 3) if oldest else 0.0,
+            "last_batch_lag_s": round(self.last_lag_s, 3),
+            "last_batch_size": self.last_batch_size,
+            "batches": self.batches,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+ingest_queue = IngestQueue()
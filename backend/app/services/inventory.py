@@ -0,0 +1,140 @@
+# backend/app/services/inventory.py
+from datetime import datetime
+from time import perf_counter
+from sqlalchemy import select, delete, insert, update
+from sqlalchemy.orm import Session
+from ..db import chunked, SessionLocal
+from ..models import Asset, Software, Service, VulnFinding
+from ..schemas import InventoryPayload, OSInfo
+from .. import metrics
+from . import changes, exposure, history, rollups
+
+class InvalidInventory(ValueError):
+    """A payload rejected before anything is written; already counted as INGEST_HOSTS{status="invalid"}."""
+
+def _diff(existing: dict, incoming: dict) -> tuple[list, list, list]:
+    """existing: key -> (id, attrs); incoming: key -> attrs. Returns (added keys, removed ids, [(id, attrs)] changed)."""
+    added = [k for k in incoming if k not in existing]
+    removed = [existing[k][0] for k in existing if k not in incoming]
+    changed = [(existing[k][0], a) for k, a in incoming.items() if k in existing and existing[k][1] != a]
+    return added, removed, changed
+
+def _sync_software(db: Session, asset_id: int, items) -> dict:
+    # Keyed on uix_asset_software (asset_id, name, version); duplicates in the payload collapse
+    incoming = {}
+    for s in items:
+        key = (s.name.strip()[:512], (s.version or "").strip()[:128] or None)
+        incoming[key] = (s.publisher or "").strip()[:256] or None
+    q = select(Software.id, Software.name, Software.version, Software.publisher).where(Software.asset_id == asset_id)
+    existing = {(name, ver): (sid, pub) for sid, name, ver, pub in db.execute(q)}
+    added, removed, changed = _diff(existing, incoming)
+
+    if removed:
+        # Findings of uninstalled software are stale now; drop them here rather than leave them
+        # to ON DELETE SET NULL (enforced on PostgreSQL) where no re-match could find them again
+        prev_products = rollups.products_for_assets(db, [asset_id])
+        for chunk in chunked(removed):
+            db.execute(delete(VulnFinding).where(VulnFinding.software_id.in_(chunk)))
+            db.execute(delete(Software).where(Software.id.in_(chunk)))
+        rollups.refresh(db, [asset_id], prev_products)
+        history.sync(db, [asset_id])
+    if added:
+        db.execute(insert(Software), [
+            {"asset_id": asset_id, "name": n, "version": v, "publisher": incoming[(n, v)]} for n, v in added
+        ])
+    if changed:
+        db.execute(update(Software), [{"id": sid, "publisher": pub} for sid, pub in changed])
+
+    added_ids = []
+    if added:
+        want = set(added)
+        q = select(Software.id, Software.name, Software.version).where(Software.asset_id == asset_id)
+        added_ids = [sid for sid, name, ver in db.execute(q) if (name, ver) in want]
+    # A publisher change can change what a row resolves to, so it is re-matched like an addition
+    changes.record_software(db, asset_id, added=added_ids + [sid for sid, _ in changed], removed=removed)
+    return {"added": len(added), "removed": len(removed), "updated": len(changed),
+            "unchanged": len(incoming) - len(added) - len(changed)}
+
+def _sync_services(db: Session, asset_id: int, items) -> dict:
+    # Keyed on uix_asset_service (asset_id, protocol, local_address, local_port)
+    incoming = {}
+    for sv in items:
+        key = ((sv.protocol or "").upper()[:10] or None, sv.local_address or None, sv.local_port)
+        incoming[key] = (sv.process or None, sv.banner or None)
+    q = select(Service.id, Service.protocol, Service.local_address, Service.local_port, Service.process, Service.banner) \
+        .where(Service.asset_id == asset_id)
+    existing = {(proto, addr, port): (sid, (proc, banner)) for sid, proto, addr, port, proc, banner in db.execute(q)}
+    added, removed, changed = _diff(existing, incoming)
+
+    for chunk in chunked(removed):
+        db.execute(delete(Service).where(Service.id.in_(chunk)))
+    if added:
+        db.execute(insert(Service), [
+            {"asset_id": asset_id, "protocol": p, "local_address": a, "local_port": port,
+             "process": incoming[(p, a, port)][0], "banner": incoming[(p, a, port)][1]}
+            for p, a, port in added
+        ])
+    if changed:
+        db.execute(update(Service), [{"id": sid, "process": proc, "banner": banner} for sid, (proc, banner) in changed])
+    return {"added": len(added), "removed": len(removed), "updated": len(changed),
+            "unchanged": len(incoming) - len(added) - len(changed)}
+
+def apply_inventory(db: Session, payload: InventoryPayload) -> dict:
+    """Upsert the asset and sync its software/services snapshot. Caller commits."""
+    t0 = perf_counter()
+    hostname = payload.hostname.strip()
+    if not hostname:
+        metrics.INGEST_HOSTS.inc(status="invalid")
+        raise InvalidInventory("hostname required")
+
+    # Upsert asset
+    asset = db.execute(select(Asset).where(Asset.hostname == hostname)).scalar_one_or_none()
+    if not asset:
+        asset = Asset(hostname=hostname)
+        db.add(asset)
+        db.flush()
+
+    # OS fields
+    os_in = payload.os if isinstance(payload.os, OSInfo) else OSInfo(**payload.os)
+    if (asset.os_name, asset.os_version, asset.os_build) != (os_in.name, os_in.version, os_in.build):
+        changes.record_os(db, asset.id)
+    asset.os_name = os_in.name
+    asset.os_version = os_in.version
+    asset.os_build = os_in.build
+    asset.updated_at = datetime.utcnow()
+    db.flush()
+
+    sw = _sync_software(db, asset.id, payload.software)
+    svc = _sync_services(db, asset.id, payload.services)
+    exposure.refresh(db, [asset.id])
+    metrics.INGEST_SECONDS.observe(perf_counter() - t0, phase="apply")
+    metrics.INGEST_HOSTS.inc(status="ingested")
+    return {"status": "ingested", "asset_id": asset.id, "hostname": hostname,
+            "software": len(payload.software), "services": len(payload.services),
+            "software_diff": sw, "services_diff": svc}
+
+def apply_payloads(db: Session, payloads: list[InventoryPayload]) -> list[dict]:
+    """Apply many inventories in one transaction and commit it; results are in input order."""
+    results = []
+    for payload in payloads:
+        try:
+            # Savepoint per host: one bad record does not sink the batch
+            with db.begin_nested():
+                results.append(apply_inventory(db, payload))
+        except InvalidInventory as e:
+            results.append({"hostname": payload.hostname, "status": "error", "error": str(e)})
+        except Exception as e:
+            metrics.INGEST_HOSTS.inc(status="error")
+            results.append({"hostname": payload.hostname, "status": "error", "error": str(e)})
+    t0 = perf_counter()
+    db.commit()
+    metrics.INGEST_SECONDS.observe(perf_counter() - t0, phase="commit")
+    return results
+
+def apply_batch(payloads: list[InventoryPayload]) -> list[dict]:
+    """apply_payloads() on a session of its own."""
+    db = SessionLocal()
+    try:
+        return apply_payloads(db, payloads)
+    finally:
+        db.close()
@@ -0,0 +1,96 @@
+# backend/app/services/match_jobs.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from ..db import SessionLocal
+from .matcher import MATCH_WORKERS, PhaseTimer, match_all
+
+JOBS_KEEP = 100
+
+@dataclass
+class MatchJob:
+    id: str
+    workers: int
+    status: str = "queued"  # queued | running | done | error
+    enqueued_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    groups_total: int = 0
+    groups_done: int = 0
+    software_total: int = 0
+    software_done: int = 0
+    result: dict | None = None
+    error: str | None = None
+
+    def progress(self, groups_done: int, groups_total: int, software_done: int, software_total: int):
+        self.groups_done, self.groups_total = groups_done, groups_total
+        self.software_done, self.software_total = software_done, software_total
+
+    def as_dict(self) -> dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.id, "status": self.status, "workers": self.workers,
+            "enqueued_at": self.enqueued_at, "started_at": self.started_at, "finished_at": self.finished_at,
+            "progress": {
+                "groups_done": self.groups_done, "groups_total": self.groups_total,
+                "software_done": self.software_done, "software_total": self.software_total,
+                "pct": round(100.0 * self.groups_done / self.groups_total, 1) if self.groups_total else 0.0,
+            },
+            "throughput": {
+                "elapsed_s": round(elapsed, 3),
+                "groups_per_s": round(self.groups_done / elapsed, 1) if elapsed else 0.0,
+                "software_per_s": round(self.software_done / elapsed, 1) if elapsed else 0.0,
+            },
+            "result": self.result, "error": self.error,
+        }
+
+class MatchJobs:
+    """
+    Runs fleet-wide matches in a background thread, one at a time.
+    Job state is in memory and does not survive a restart.
+    """
+
+    def __init__(self):
+        self._jobs: OrderedDict[str, MatchJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._active: MatchJob | None = None
+
+    def submit(self, workers: int | None = None) -> MatchJob:
+        """Raises RuntimeError while another fleet match is queued or running."""
+        with self._lock:
+            if self._active is not None:
+                raise RuntimeError(f"match job {self._active.id} is already {self._active.status}")
+            job = self._active = MatchJob(id=uuid.uuid4().hex, workers=workers or MATCH_WORKERS)
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOBS_KEEP:
+                self._jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job,), name=f"match-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def active(self) -> MatchJob | None:
+        """The fleet match queued or running, if any."""
+        with self._lock:
+            return self._active
+
+    def get(self, job_id: str) -> MatchJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: MatchJob):
+        job.status, job.started_at = "running", time.time()
+        db = SessionLocal()
+        try:
+            job.result = match_all(db, PhaseTimer(), workers=job.workers, progress=job.progress)
+            job.status = "done"
+        except Exception as e:
+            db.rollback()
+            job.status, job.error = "error", str(e)
+        finally:
+            db.close()
+            job.finished_at = time.time()
+            with self._lock:
+                self._active = None
+
+match_jobs = MatchJobs()
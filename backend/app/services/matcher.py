@@ -1,147 +1,396 @@
-from sqlalchemy import select, delete, or_, and_
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Iterator, NamedTuple
+from sqlalchemy import select, delete, func, insert, update
 from sqlalchemy.orm import Session
-import re
-from packaging import version as pver
-from ..models import Asset, Software, CVE, CVECPE, VulnFinding
-
-ALIASES = {
-    "edge": "microsoft edge",
-    "chrome": "google chrome",
-    "adobe reader": "acrobat reader",
-    "7-zip": "7 zip",
-}
-
-# NEW: direct vendor/product mapping for common apps
-KNOWN = [
-    # (needle substring in software name, vendor, product)
-    ("7 zip", "7-zip", "7-zip"),
-    ("winrar", "rarlab", "winrar"),
-    ("vlc media player", "videolan", "vlc_media_player"),
-    ("notepad++", "don_ho", "notepad++"),
-    ("git", "git-scm", "git"),  # sometimes vendor listed as 'git'
-    ("python", "python_software_foundation", "python"),
-    ("java", "oracle", "jdk"),
-    ("java", "oracle", "jre"),
-    ("node.js", "nodejs", "node.js"),
-    ("putty", "simon_tatham", "putty"),
-    ("winscp", "martin_prikryl", "winscp"),
-    ("nvidia", "nvidia", "geforce_experience"),  # heuristic; drivers vary
-    ("openvpn", "openvpn", "openvpn"),
-    ("winscp", "martin_prikryl", "winscp"),
-    ("vmware tools", "vmware", "tools"),
-    ("docker desktop", "docker", "docker_desktop"),
-    ("google chrome", "google", "chrome"),
-    ("microsoft edge", "microsoft", "edge"),
-    ("adobe acrobat", "adobe", "acrobat"),
-    ("adobe reader", "adobe", "acrobat_reader"),
-]
-
-def _norm(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", " ", (s or "").lower()).strip()
-
-def _alias_name(name: str) -> str:
-    n = _norm(name)
-    for k, v in ALIASES.items():
-        if k in n:
-            n = n.replace(k, v)
-    return n
+from ..db import chunked
+from .. import metrics
+from ..models import Asset, Software, CVE, MatchChange, VulnFinding
+from .cpe_index import CPEEntry, get_index, is_os_key, norm as _norm
+from .cpe_map import CPEResolver, get_resolver
+from .os_match import get_os_index, platform
+from . import changes, history, rollups
+from .versions import which_contain
+
+WRITE_BATCH = 5000
+_SW_COLS = (Software.id, Software.asset_id, Software.name, Software.version, Software.publisher, Software.exposed)
+MATCH_WORKERS = int(os.getenv("VM_SCOUT_MATCH_WORKERS", "0")) or (os.cpu_count() or 1)
+SHARD_SIZE = int(os.getenv("VM_SCOUT_MATCH_SHARD", "250"))  # software groups per worker task
+ASSET_BATCH = int(os.getenv("VM_SCOUT_MATCH_ASSET_BATCH", "50"))  # assets rewritten per commit in match_all
+
+def _group_key(sw) -> tuple:
+    # Everything _resolve looks at is a function of these three values
+    return (_norm(sw.name), sw.version, _norm(sw.publisher or ""))
+
+class PhaseTimer:
+    """
+    Accumulates wall time per matcher phase (candidate, range, os, write, rollups, history) and work counts
+    (software, candidates). Worker timers are merged in, so candidate and range sum time across processes.
+    """
+
+    def __init__(self):
+        self.totals: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
 
-def _tokens(s: str) -> set[str]:
-    return {t for t in _norm(s).split() if len(t) >= 3 and t not in {"microsoft","inc","corporation","corp","the"}}
-
-def _version_in_range(v, s_incl, s_excl, e_incl, e_excl) -> bool:
-    if not v:
-        return True
-    try:
-        V = pver.parse(v)
-        if s_incl and V <  pver.parse(s_incl): return False
-        if s_excl and V <= pver.parse(s_excl): return False
-        if e_incl and V >  pver.parse(e_incl): return False
-        if e_excl and V >= pver.parse(e_excl): return False
-    except Exception:
-        return True
-    return True
-
-def _candidate_cpes(db: Session, sw: Software):
-    name = _alias_name(sw.name)
-    toks = list(_tokens(name))
-    if not toks:
-        return []
-    conds = [CVECPE.product.ilike(f"%{t}%") for t in toks]
-    if sw.publisher:
-        pub = _norm(sw.publisher)
-        if pub:
-            conds.append(CVECPE.vendor.ilike(f"%{pub}%"))
-    q = select(CVECPE).where(or_(*conds)).limit(10000)
-    return db.execute(q).scalars().all()
-
-def _score_match(sw: Software, cpe: CVECPE) -> float:
-    st = _tokens(_alias_name(sw.name))
-    pt = _tokens(cpe.product or "")
-    score = len(st.intersection(pt))
-    if sw.publisher and cpe.vendor and cpe.vendor in _norm(sw.publisher):
-        score += 1.0
-    return score
-
-def _direct_known_matches(db: Session, sw: Software):
-    n = _norm(sw.name)
-    for needle, vendor, product in KNOWN:
-        if needle in n:
-            # Fetch all CVE CPE entries for that vendor/product
-            q = select(CVECPE).where(and_(CVECPE.vendor==vendor, CVECPE.product==product)).limit(5000)
-            rows = db.execute(q).scalars().all()
-            if rows:
-                return rows
-    return []
-
-def match_asset(db: Session, asset_id: int) -> int:
+    def count(self, name: str, n: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other: "PhaseTimer"):
+        for k, v in other.totals.items():
+            self.totals[k] = self.totals.get(k, 0.0) + v
+        for k, v in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + perf_counter() - t0
+
+    def report(self) -> dict:
+        return {k: round(v * 1000, 2) for k, v in self.totals.items()}
+
+def _resolve(resolver: CPEResolver, sw, timer: PhaseTimer | None = None) -> list[CPEEntry]:
+    """Candidate CPEs for one software row that survive the version check, one per CVE."""
+    timer = timer or PhaseTimer()
+    with timer.phase("candidate"):
+        # Rule mapping or fuzzy token search, resolved once per (name, publisher); see services/cpe_map.py
+        cpes = resolver.rows(sw)
+        timer.count("software")
+        timer.count("candidates", len(cpes))
+        if not cpes:
+            return []
+
+    with timer.phase("range"):
+        hits, seen = [], set()
+        for i in which_contain(sw.version, [c.range for c in cpes]):
+            cpe = cpes[i]
+            if cpe.cve_id not in seen:
+                seen.add(cpe.cve_id)
+                hits.append(cpe)
+    return hits
+
+_OS_COLS = (Asset.id, Asset.os_name, Asset.os_version, Asset.os_build, Asset.os_exposed)
+
+def _match_os(db: Session, assets, timer: PhaseTimer) -> list[tuple[list, list]]:
+    """
+    (members, hits) per Windows platform of the given (id, os_name, os_version, os_build, os_exposed) rows.
+    Hosts on the same build and revision are looked up once; members stand in for software rows
+    with no software id and the OS build as detected version.
+    """
+    with timer.phase("os"):
+        index = get_os_index(db)
+        groups: dict = {}
+        for aid, name, version, build, exposed in assets:
+            p = platform(name, version, build)
+            if p:
+                groups.setdefault(p, []).append(SwRow(None, aid, name, p.version, None, bool(exposed)))
+        timer.count("os_builds", len(groups))
+        return [(members, index.match(p)) for p, members in groups.items()]
+
+def _cve_meta(db: Session, cve_ids) -> dict[str, tuple]:
+    meta = {}
+    for chunk in chunked(cve_ids):
+        q = select(CVE.id, CVE.severity, CVE.cvss, CVE.kev).where(CVE.id.in_(chunk))
+        for cid, sev, cvss, kev in db.execute(q):
+            meta[cid] = (sev, cvss, kev)
+    return meta
+
+def _write_findings(db: Session, resolved: list[tuple[list, list[CPEEntry]]]) -> int:
+    """resolved: (member software rows, hits) pairs. Severity/cvss/kev come from one batched CVE fetch."""
+    meta = _cve_meta(db, {cpe.cve_id for _, hits in resolved for cpe in hits})
+    batch, created = [], 0
+    for members, hits in resolved:
+        for cpe in hits:
+            m = meta.get(cpe.cve_id)
+            if not m:
+                continue
+            for sw in members:
+                batch.append({
+                    "asset_id": sw.asset_id,
+                    "software_id": sw.id,
+                    "cve_id": cpe.cve_id,
+                    "product": cpe.product,
+                    "detected_version": sw.version,
+                    "severity": m[0],
+                    "cvss": m[1],
+                    "kev": m[2],
+                    "exposed": bool(sw.exposed),
+                })
+                if len(batch) >= WRITE_BATCH:
+                    db.execute(insert(VulnFinding), batch)
+                    created += len(batch)
+                    batch = []
+    if batch:
+        db.execute(insert(VulnFinding), batch)
+        created += len(batch)
+    metrics.FINDINGS_WRITTEN.inc(created)
+    return created
+
+def match_asset(db: Session, asset_id: int, timer: PhaseTimer | None = None) -> int:
+    timer = timer or PhaseTimer()
     asset = db.get(Asset, asset_id)
     if not asset:
         return 0
 
+    prev_products = rollups.products_for_assets(db, [asset_id])
     db.execute(delete(VulnFinding).where(VulnFinding.asset_id == asset_id))
-    db.flush()
 
-    created = 0
-    sw_rows = db.execute(select(Software).where(Software.asset_id==asset_id)).scalars().all()
-    for sw in sw_rows:
-        # 1) Try direct known mapping first
-        cpes = _direct_known_matches(db, sw)
+    sw_rows = db.execute(select(*_SW_COLS).where(Software.asset_id == asset_id)).all()
+    resolver = get_resolver(db, get_index(db), sw_rows)
+    resolved = [([sw], _resolve(resolver, sw, timer)) for sw in sw_rows]
+    resolved += _match_os(db, [(asset.id, asset.os_name, asset.os_version, asset.os_build, asset.os_exposed)], timer)
 
-        # 2) Fall back to fuzzy product token search
-        if not cpes:
-            cpes = _candidate_cpes(db, sw)
+    with timer.phase("write"):
+        created = _write_findings(db, resolved)
+        resolver.save(db)
+    with timer.phase("rollups"):
+        rollups.refresh(db, [asset_id], prev_products)
+    with timer.phase("history"):
+        history.sync(db, [asset_id])
+        db.commit()
+    metrics.record_match("asset", timer)
+    return created
 
-        if not cpes:
-            continue
+class SwRow(NamedTuple):
+    # Picklable stand-in for a Software row; what _resolve reads from it. id is None for the OS itself
+    id: int | None
+    asset_id: int
+    name: str
+    version: str | None
+    publisher: str | None
+    exposed: bool = False
 
-        # Keep best candidates
-        cpes = sorted(cpes, key=lambda x: _score_match(sw, x), reverse=True)[:100]
+class Hit(NamedTuple):
+    # What _write_findings needs from a CPEEntry; cheap to send back from a worker
+    cve_id: str
+    product: str | None
 
-        for cpe in cpes:
-            if not _version_in_range(sw.version, cpe.vers_start_incl, cpe.vers_start_excl, cpe.vers_end_incl, cpe.vers_end_excl):
-                continue
-            cve = db.get(CVE, cpe.cve_id)
-            if not cve:
-                continue
-            db.add(VulnFinding(
-                asset_id=asset_id,
-                software_id=sw.id,
-                cve_id=cve.id,
-                product=cpe.product,
-                detected_version=sw.version,
-                severity=cve.severity,
-                cvss=cve.cvss,
-                kev=cve.kev,
-            ))
-            created += 1
+_worker_resolver: CPEResolver | None = None
+
+def _init_worker(resolver: CPEResolver):
+    global _worker_resolver
+    _worker_resolver = resolver
+
+def _resolve_shard(shard: list[SwRow]) -> tuple[list[list[Hit]], PhaseTimer, dict]:
+    timer = PhaseTimer()
+    out = [[Hit(c.cve_id, c.product) for c in _resolve(_worker_resolver, sw, timer)] for sw in shard]
+    learned = dict(_worker_resolver.learned)
+    _worker_resolver.learned.clear()
+    return out, timer, learned
+
+def _resolve_groups(resolver: CPEResolver, groups: list[list], workers: int, timer: PhaseTimer) -> Iterator[list[tuple]]:
+    """Yields (members, hits) batches, one per shard, in completion order."""
+    shards = [groups[n:n + SHARD_SIZE] for n in range(0, len(groups), SHARD_SIZE)]
+    if workers <= 1 or len(shards) <= 1:
+        for shard in shards:
+            yield [(members, _resolve(resolver, members[0], timer)) for members in shard]
+        return
+    # Workers come from a forkserver: forking this job thread inside a server with an event loop, writer and
+    # driver threads could copy a held lock into the child. Each worker unpickles the resolver (index, rules,
+    # cached mappings) once at start-up; each task carries representative rows out and (cve_id, product)
+    # pairs plus newly computed mappings back, which the parent persists
+    with ProcessPoolExecutor(min(workers, len(shards)), mp_context=multiprocessing.get_context("forkserver"),
+                             initializer=_init_worker, initargs=(resolver,)) as pool:
+        futs = {pool.submit(_resolve_shard, [SwRow(*m[0]) for m in shard]): shard for shard in shards}
+        for fut in as_completed(futs):
+            hits, shard_timer, learned = fut.result()
+            timer.merge(shard_timer)
+            resolver.learned.update(learned)
+            yield list(zip(futs[fut], hits))
+
+def match_all(db: Session, timer: PhaseTimer | None = None, workers: int = 1,
+              progress: Callable[[int, int, int, int], None] | None = None) -> dict:
+    """
+    Fleet-wide match: software rows are grouped by normalized (name, version, publisher),
+    each group is resolved once and its findings are fanned out to every member asset.
+    With workers > 1 groups are resolved in a process pool; this session stays the only writer.
+    Findings are then rewritten ASSET_BATCH assets per commit, so ingest and feed writers are
+    not locked out for the whole run; what they change meanwhile stays pending for match_incremental.
+    progress(groups_done, groups_total, software_done, software_total) is called after each shard
+    is resolved and each batch is written.
+    """
+    timer = timer or PhaseTimer()
+    # Changes recorded after this are not covered by the snapshot below and stay pending
+    upto = db.scalar(select(func.max(MatchChange.id))) or 0
+    ids = db.execute(select(Asset.id).order_by(Asset.id)).scalars().all()
+    groups: dict[tuple, list] = {}
+    sw_rows = db.execute(select(*_SW_COLS)).all()
+    for sw in sw_rows:
+        groups.setdefault(_group_key(sw), []).append(sw)
+    with timer.phase("candidate"):
+        resolver = get_resolver(db, get_index(db), [members[0] for members in groups.values()])
+    os_by_asset: dict[int, tuple] = {}
+    os_resolved = _match_os(db, db.execute(select(*_OS_COLS)).all(), timer)
+    for members, hits in os_resolved:
+        for row in members:
+            os_by_asset[row.asset_id] = ([row], hits)
+    db.commit()  # end the snapshot's read transaction before the pool runs
 
+    hits_by_group: dict[tuple, list] = {}
+    done_groups = 0
+    if progress:
+        progress(0, len(groups), 0, len(sw_rows))
+    for resolved in _resolve_groups(resolver, list(groups.values()), workers, timer):
+        for members, hits in resolved:
+            hits_by_group[_group_key(members[0])] = hits
+        done_groups += len(resolved)
+        if progress:
+            progress(done_groups, len(groups), 0, len(sw_rows))
+
+    total = done_sw = 0
+    products: set[str] = set()
+    for n in range(0, len(ids), ASSET_BATCH):
+        batch = ids[n:n + ASSET_BATCH]
+        with timer.phase("write"):
+            # Software as it is now: rows added since the snapshot are pending changes, removed ones are skipped
+            live = db.execute(select(*_SW_COLS).where(Software.asset_id.in_(batch))).all()
+            resolved = [([sw], hits_by_group[k]) for sw in live if (k := _group_key(sw)) in hits_by_group]
+            present = set(db.execute(select(Asset.id).where(Asset.id.in_(batch))).scalars())
+            resolved += [os_by_asset[aid] for aid in present if aid in os_by_asset]
+            products |= rollups.products_for_assets(db, present)
+            db.execute(delete(VulnFinding).where(VulnFinding.asset_id.in_(batch)))
+            total += _write_findings(db, resolved)
+        with timer.phase("rollups"):
+            rollups.refresh_assets(db, present)
+            products |= rollups.products_for_assets(db, present)
+        with timer.phase("history"):
+            history.sync(db, present)
+        db.commit()
+        done_sw += len(live)
+        if progress:
+            progress(done_groups, len(groups), done_sw, len(sw_rows))
+
+    with timer.phase("write"):
+        resolver.save(db)
+        resolver.purge_stale(db)
+        changes.clear(db, upto)
+    with timer.phase("rollups"):
+        rollups.refresh_products(db, products)
     db.commit()
-    return created
+    metrics.record_match("full", timer)
+    return {"assets": len(ids), "findings": total, "groups": len(groups), "software": len(sw_rows),
+            "os_builds": len(os_resolved), "workers": workers, "timings_ms": timer.report()}
+
+def _refresh_finding_meta(db: Session, cve_ids) -> int:
+    def col(c):
+        return select(c).where(CVE.id == VulnFinding.cve_id).scalar_subquery()
+    n = 0
+    for chunk in chunked(cve_ids):
+        n += db.execute(
+            update(VulnFinding).where(VulnFinding.cve_id.in_(chunk))
+            .values(severity=col(CVE.severity), cvss=col(CVE.cvss), kev=col(CVE.kev))
+        ).rowcount
+    return n
+
+def match_incremental(db: Session, timer: PhaseTimer | None = None) -> dict:
+    """
+    Re-evaluate only software touched by pending changes (see services/changes.py):
+    added/removed software rows, CVEs replaced by the NVD feed (plus every software whose
+    candidate products intersect them) and KEV/CVSS metadata. Findings are diffed, not rebuilt.
+    The OS is re-matched for assets whose OS changed or that had findings on a replaced CVE,
+    and for every asset when a replaced CVE names a Windows product.
+    """
+    timer = timer or PhaseTimer()
+    cs = changes.pending(db)
+    out = {"software": 0, "os_assets": 0, "cves": len(cs.cves | cs.cve_meta), "added": 0, "removed": 0, "updated": 0}
+    if not cs:
+        return {**out, "timings_ms": timer.report()}
+
+    index = get_index(db)
+    resolver = None
+    affected = set(cs.software)
+    with timer.phase("candidate"):
+        for chunk in chunked(cs.cves):
+            affected.update(db.execute(
+                select(VulnFinding.software_id).where(VulnFinding.cve_id.in_(chunk), VulnFinding.software_id.is_not(None)).distinct()
+            ).scalars())
+        if cs.products:
+            hit: dict[tuple, bool] = {}
+            sw_all = db.execute(select(*_SW_COLS)).all()
+            resolver = get_resolver(db, index, sw_all)
+            for sw in sw_all:
+                k = _group_key(sw)
+                if k not in hit:
+                    hit[k] = bool(resolver.keys(sw) & cs.products)
+                if hit[k]:
+                    affected.add(sw.id)
+    affected -= cs.software_removed
+    out["software"] = len(affected)
+
+    if any(is_os_key(*k) for k in cs.products):
+        os_rows = db.execute(select(*_OS_COLS)).all()
+    else:
+        os_ids = set(cs.os_assets)
+        for chunk in chunked(cs.cves):
+            os_ids.update(db.execute(
+                select(VulnFinding.asset_id).where(VulnFinding.cve_id.in_(chunk), VulnFinding.software_id.is_(None)).distinct()
+            ).scalars())
+        os_rows = [r for chunk in chunked(os_ids) for r in db.execute(select(*_OS_COLS).where(Asset.id.in_(chunk)))]
+    out["os_assets"] = len(os_rows)
+    os_desired: dict[tuple[int, str, str], tuple] = {}
+    for members, hits in _match_os(db, os_rows, timer):
+        for row in members:
+            for hit in hits:
+                os_desired[(row.asset_id, hit.cve_id, row.version)] = (row, hit)
+
+    groups: dict[tuple, list] = {}
+    for chunk in chunked(affected):
+        for sw in db.execute(select(*_SW_COLS).where(Software.id.in_(chunk))):
+            groups.setdefault(_group_key(sw), []).append(sw)
+    if resolver is None:
+        resolver = get_resolver(db, index, [members[0] for members in groups.values()])
+    desired: dict[tuple[int, str], tuple] = {}
+    for members in groups.values():
+        hits = _resolve(resolver, members[0], timer)
+        for sw in members:
+            for cpe in hits:
+                desired[(sw.id, cpe.cve_id)] = (sw, cpe)
 
-def match_all(db: Session) -> dict:
-    ids = db.execute(select(Asset.id)).scalars().all()
-    total = 0
-    for aid in ids:
-        total += match_asset(db, aid)
-    return {"assets": len(ids), "findings": total}
+    with timer.phase("write"):
+        stale = []
+        touched_assets, touched_products = rollups.affected_by_cves(db, cs.cves | cs.cve_meta)
+        for chunk in chunked(cs.software_removed):
+            q = select(VulnFinding.id, VulnFinding.asset_id, VulnFinding.product).where(VulnFinding.software_id.in_(chunk))
+            for fid, aid, prod in db.execute(q):
+                stale.append(fid)
+                touched_assets.add(aid)
+                touched_products.add(prod or "")
+        for chunk in chunked(affected):
+            q = select(VulnFinding.id, VulnFinding.software_id, VulnFinding.cve_id, VulnFinding.asset_id, VulnFinding.product) \
+                .where(VulnFinding.software_id.in_(chunk))
+            for fid, sw_id, cve_id, aid, prod in db.execute(q):
+                if desired.pop((sw_id, cve_id), None) is None:
+                    stale.append(fid)
+                    touched_assets.add(aid)
+                    touched_products.add(prod or "")
+        for chunk in chunked([r[0] for r in os_rows]):
+            q = select(VulnFinding.id, VulnFinding.asset_id, VulnFinding.cve_id, VulnFinding.detected_version, VulnFinding.product) \
+                .where(VulnFinding.asset_id.in_(chunk), VulnFinding.software_id.is_(None))
+            for fid, aid, cve_id, version, prod in db.execute(q):
+                if os_desired.pop((aid, cve_id, version), None) is None:
+                    stale.append(fid)
+                    touched_assets.add(aid)
+                    touched_products.add(prod or "")
+        touched_assets.update(sw.asset_id for sw, _ in desired.values())
+        touched_assets.update(row.asset_id for row, _ in os_desired.values())
+        for chunk in chunked(stale):
+            db.execute(delete(VulnFinding).where(VulnFinding.id.in_(chunk)))
+        out["removed"] = len(stale)
+        # Whatever is left in `desired` does not exist yet
+        out["added"] = _write_findings(db, [([sw], [cpe]) for sw, cpe in [*desired.values(), *os_desired.values()]])
+        out["updated"] = _refresh_finding_meta(db, cs.cves | cs.cve_meta)
+        resolver.save(db)
+        changes.clear(db, cs.upto_id)
+    with timer.phase("rollups"):
+        rollups.refresh(db, touched_assets, touched_products)
+    with timer.phase("history"):
+        history.sync(db, touched_assets)
+        db.commit()
+    metrics.record_match("incremental", timer)
+    return {**out, "timings_ms": timer.report()}
@@ -0,0 +1,173 @@
+# backend/app/services/os_match.py
+import re
+import threading
+from bisect import bisect_left
+from typing import NamedTuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import CVECPE
+from .cpe_index import OS_FAMILY, _cpe_version, _signature
+
+# Windows build number -> release label as NVD spells it in product names (windows_10_22h2, ...)
+CLIENT_RELEASES = {
+    10240: "1507", 10586: "1511", 14393: "1607", 15063: "1703", 16299: "1709", 17134: "1803", 17763: "1809",
+    18362: "1903", 18363: "1909", 19041: "2004", 19042: "20h2", 19043: "21h1", 19044: "21h2", 19045: "22h2",
+    22000: "21h2", 22621: "22h2", 22631: "23h2", 26100: "24h2",
+}
+SERVER_RELEASES = {
+    14393: "2016", 16299: "1709", 17134: "1803", 17763: "2019", 18362: "1903", 18363: "1909", 19041: "2004",
+    19042: "20h2", 20348: "2022", 25398: "2022_23h2", 26100: "2025",
+}
+WINDOWS_11 = 22000  # first Windows 11 build; both report themselves as 10.0.x
+
+_BUILD = re.compile(r"(\d+)\.(\d+)\.(\d+)(?:\.(\d+))?")
+
+Build = tuple[int, int, int, int]  # major, minor, build, update revision (UBR)
+
+class Platform(NamedTuple):
+    server: bool
+    build: Build
+
+    @property
+    def version(self) -> str:
+        return ".".join(map(str, self.build))
+
+    def products(self) -> list[str]:
+        b = self.build[2]
+        if self.server:
+            label = SERVER_RELEASES.get(b)
+            return [f"windows_server_{label}"] if label else []
+        generic = "windows_11" if b >= WINDOWS_11 else "windows_10"
+        label = CLIENT_RELEASES.get(b)
+        return [generic, f"{generic}_{label}"] if label else [generic]
+
+def parse_build(s: str | None) -> Build | None:
+    m = _BUILD.fullmatch((s or "").strip())
+    if not m:
+        return None
+    return tuple(int(g or 0) for g in m.groups())
+
+def platform(os_name: str | None, os_version: str | None, os_build: str | None) -> Platform | None:
+    """
+    Windows 10/11/Server platform of an asset, or None. os_build is preferred as sent by collect.ps1
+    (10.0.<build>.<UBR>); otherwise the build comes from os_version and the UBR from a "<build>.<UBR>"
+    os_build, and is 0 when unknown, which matches every fix released for that build.
+    """
+    name = (os_name or "").lower()
+    if "windows" not in name:
+        return None
+    build = parse_build(os_build)
+    if build is None:
+        base = parse_build(os_version)
+        if base is None:
+            return None
+        ubr = 0
+        m = re.match(r"(\d+)\.(\d+)", (os_build or "").strip())
+        if m and int(m.group(1)) == base[2]:
+            ubr = int(m.group(2))
+        build = (base[0], base[1], base[2], ubr)
+    if build[:2] != (10, 0):
+        return None
+    return Platform("server" in name, build)
+
+class OSHit(NamedTuple):
+    cve_id: str
+    product: str
+
+# A cut sits just before (side 0) or just after (side 1) a build; builds are looked up as (build, 0.5)
+_Cut = tuple[Build, int]
+
+class BuildIntervals:
+    """
+    Version ranges of one product over build numbers. The range bounds split the build line into
+    elementary segments, each holding every range that covers it, so a lookup is one bisect.
+    """
+
+    def __init__(self, ranges: list[tuple[_Cut | None, _Cut | None, OSHit]]):
+        self.cuts: list[_Cut] = sorted({c for lo, hi, _ in ranges for c in (lo, hi) if c is not None})
+        self.segments: list[list[OSHit]] = [[] for _ in range(len(self.cuts) + 1)]
+        for lo, hi, hit in ranges:
+            first = bisect_left(self.cuts, lo) + 1 if lo is not None else 0
+            last = bisect_left(self.cuts, hi) if hi is not None else len(self.cuts)
+            for seg in self.segments[first:last + 1]:
+                seg.append(hit)
+
+    def lookup(self, build: Build) -> list[OSHit]:
+        return self.segments[bisect_left(self.cuts, (build, 0.5))]
+
+def _bounds(product: str, version: str | None, s_incl, s_excl, e_incl, e_excl) -> tuple[_Cut | None, _Cut | None] | None:
+    """Range of one cve_cpes row as (lo, hi) cuts, None for open ends; None if a bound is not a build number."""
+    if not (s_incl or s_excl or e_incl or e_excl):
+        if not version or version in ("*", "-"):
+            return None, None
+        b = parse_build(version)
+        if b is not None:
+            return (b, 0), (b, 1)
+        # Old entries name the release instead (windows_10:1809); it covers that build's every revision
+        if product.startswith("windows_server"):
+            builds = [n for n, label in SERVER_RELEASES.items() if label == version]
+        else:
+            builds = [n for n, label in CLIENT_RELEASES.items() if label == version and (n >= WINDOWS_11) == product.startswith("windows_11")]
+        return (((10, 0, builds[0], 0), 0), ((10, 0, builds[0] + 1, 0), 0)) if builds else None
+    cuts = []
+    for raw, side in ((s_incl, 0), (s_excl, 1), (e_incl, 1), (e_excl, 0)):
+        b = parse_build(raw) if raw else None
+        if raw and b is None:
+            return None
+        cuts.append((b, side) if b else None)
+    return cuts[0] or cuts[1], cuts[2] or cuts[3]
+
+class OSIndex:
+    """Per-product build interval index over the Windows 10/11/Server rows of cve_cpes."""
+
+    def __init__(self, products: dict[str, BuildIntervals], signature: tuple | None = None):
+        self.products = products
+        self.signature = signature
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def match(self, p: Platform) -> list[OSHit]:
+        hits, seen = [], set()
+        for product in p.products():
+            iv = self.products.get(product)
+            for hit in iv.lookup(p.build) if iv else ():
+                if hit.cve_id not in seen:
+                    seen.add(hit.cve_id)
+                    hits.append(hit)
+        return hits
+
+def build_os_index(db: Session) -> OSIndex:
+    sig = _signature(db)
+    q = select(CVECPE.cve_id, CVECPE.product, CVECPE.cpe23, CVECPE.vers_start_incl, CVECPE.vers_start_excl,
+               CVECPE.vers_end_incl, CVECPE.vers_end_excl) \
+        .where(CVECPE.vendor == "microsoft", CVECPE.product.like("windows%"))
+    ranges: dict[str, list] = {}
+    for cve_id, product, cpe23, *bounds in db.execute(q):
+        if not OS_FAMILY.fullmatch(product or ""):
+            continue
+        b = _bounds(product, _cpe_version(cpe23), *bounds)
+        if b is not None:
+            ranges.setdefault(product, []).append((*b, OSHit(cve_id, product)))
+    return OSIndex({p: BuildIntervals(r) for p, r in ranges.items()}, signature=sig)
+
+_index: OSIndex | None = None
+_lock = threading.Lock()
+
+def get_os_index(db: Session) -> OSIndex:
+    """Process-wide index, rebuilt whenever the cve_cpes generation (see cpe_index._signature) moved."""
+    global _index
+    sig = _signature(db)
+    idx = _index
+    if idx is not None and idx.signature == sig:
+        return idx
+    with _lock:
+        if _index is None or _index.signature != sig:
+            _index = build_os_index(db)
+        return _index
+
+def refresh_os_index(db: Session) -> OSIndex:
+    global _index
+    with _lock:
+        _index = build_os_index(db)
+        return _index
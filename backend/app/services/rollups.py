@@ -0,0 +1,101 @@
+# backend/app/services/rollups.py
+from typing import Iterable
+from sqlalchemy import select, delete, insert, func, case, or_
+from sqlalchemy.orm import Session
+from ..db import chunked
+from ..models import Asset, VulnFinding, AssetRisk, ProductRisk
+
+# risk_score = criticality weight * (sum of CVSS + KEV_WEIGHT per KEV finding)
+CRITICALITY_WEIGHTS = {"critical": 4.0, "high": 2.0, "medium": 1.0, "low": 0.5}
+DEFAULT_WEIGHT = 1.0
+KEV_WEIGHT = 10.0
+
+def _count(cond):
+    return func.sum(case((cond, 1), else_=0))
+
+def _severity_cols():
+    sev = func.upper(VulnFinding.severity)
+    return (
+        _count(sev == "CRITICAL"), _count(sev == "HIGH"), _count(sev == "MEDIUM"), _count(sev == "LOW"),
+        func.count(), _count(VulnFinding.kev.is_(True)), func.max(VulnFinding.cvss),
+    )
+
+def _counts(crit, high, med, low, total, kev, max_cvss) -> dict:
+    return {"critical": crit or 0, "high": high or 0, "medium": med or 0, "low": low or 0,
+            "unknown": total - (crit or 0) - (high or 0) - (med or 0) - (low or 0),
+            "kev": kev or 0, "total": total, "max_cvss": max_cvss}
+
+def products_for_assets(db: Session, asset_ids: Iterable[int]) -> set[str]:
+    out: set[str] = set()
+    for chunk in chunked(asset_ids):
+        out.update(p or "" for p in db.execute(
+            select(VulnFinding.product).where(VulnFinding.asset_id.in_(chunk)).distinct()).scalars())
+    return out
+
+def affected_by_cves(db: Session, cve_ids: Iterable[str]) -> tuple[set[int], set[str]]:
+    assets: set[int] = set()
+    products: set[str] = set()
+    for chunk in chunked(cve_ids):
+        for aid, prod in db.execute(select(VulnFinding.asset_id, VulnFinding.product).where(VulnFinding.cve_id.in_(chunk)).distinct()):
+            assets.add(aid)
+            products.add(prod or "")
+    return assets, products
+
+def refresh_assets(db: Session, asset_ids: Iterable[int]):
+    for chunk in chunked(asset_ids):
+        weights = {aid: CRITICALITY_WEIGHTS.get((crit or "").lower(), DEFAULT_WEIGHT)
+                   for aid, crit in db.execute(select(Asset.id, Asset.criticality).where(Asset.id.in_(chunk)))}
+        q = select(VulnFinding.asset_id, *_severity_cols(), func.sum(func.coalesce(VulnFinding.cvss, 0.0))) \
+            .where(VulnFinding.asset_id.in_(chunk)).group_by(VulnFinding.asset_id)
+        stats = {r[0]: r[1:] for r in db.execute(q)}
+        rows = []
+        for aid, weight in weights.items():
+            *cols, cvss_sum = stats.get(aid, (0, 0, 0, 0, 0, 0, None, 0.0))
+            c = _counts(*cols)
+            rows.append({"asset_id": aid, **c, "risk_score": round(weight * ((cvss_sum or 0.0) + KEV_WEIGHT * c["kev"]), 2)})
+        db.execute(delete(AssetRisk).where(AssetRisk.asset_id.in_(chunk)))
+        if rows:
+            db.execute(insert(AssetRisk), rows)
+
+def refresh_products(db: Session, products: Iterable[str]):
+    for chunk in chunked(products):
+        prod = func.coalesce(VulnFinding.product, "")
+        # Filter on the bare column so ix_findings_product_id applies; "" stands for NULL or empty
+        cond = VulnFinding.product.in_([p for p in chunk if p])
+        if "" in chunk:
+            cond = or_(cond, VulnFinding.product.is_(None), VulnFinding.product == "")
+        q = select(prod, func.count(VulnFinding.asset_id.distinct()), *_severity_cols()) \
+            .where(cond).group_by(prod)
+        rows = [{"product": p, "assets": n, **_counts(*cols)} for p, n, *cols in db.execute(q)]
+        db.execute(delete(ProductRisk).where(ProductRisk.product.in_(chunk)))
+        if rows:
+            db.execute(insert(ProductRisk), rows)
+
+def refresh(db: Session, asset_ids: Iterable[int], products: Iterable[str] = ()):
+    """
+    Recompute rollups after findings of `asset_ids` changed. `products` are the products
+    those assets had before the write; the ones they have now are added here.
+    """
+    asset_ids = set(asset_ids)
+    refresh_assets(db, asset_ids)
+    refresh_products(db, set(products) | products_for_assets(db, asset_ids))
+
+def rebuild(db: Session):
+    db.execute(delete(AssetRisk))
+    db.execute(delete(ProductRisk))
+    refresh_assets(db, db.execute(select(Asset.id)).scalars().all())
+    refresh_products(db, [p or "" for p in db.execute(select(VulnFinding.product).distinct()).scalars()])
+
+def fleet_summary(db: Session) -> dict:
+    q = select(
+        func.count(), func.sum(AssetRisk.critical), func.sum(AssetRisk.high), func.sum(AssetRisk.medium),
+        func.sum(AssetRisk.low), func.sum(AssetRisk.unknown), func.sum(AssetRisk.kev), func.sum(AssetRisk.total),
+        func.max(AssetRisk.max_cvss), func.sum(AssetRisk.risk_score), _count(AssetRisk.total > 0),
+    )
+    n, crit, high, med, low, unk, kev, total, max_cvss, risk, vulnerable = db.execute(q).one()
+    return {
+        "assets_rolled_up": n, "vulnerable_assets": vulnerable or 0,
+        "findings": {"total": total or 0, "critical": crit or 0, "high": high or 0, "medium": med or 0,
+                     "low": low or 0, "unknown": unk or 0, "kev": kev or 0},
+        "max_cvss": max_cvss, "risk_score": round(risk or 0.0, 2),
+    }
@@ -0,0 +1,78 @@
+# backend/app/services/versions.py
+import re
+from functools import lru_cache
+from typing import NamedTuple, Sequence
+from packaging.version import Version, InvalidVersion
+
+# Dotted number run, e.g. "23.01 beta" -> "23.01", "10.0.19041.1 (WinBuild...)" -> "10.0.19041.1"
+_NUMERIC = re.compile(r"\d+(?:[._-]\d+)*")
+
+@lru_cache(maxsize=65536)
+def version_key(v: str | None) -> Version | None:
+    """
+    Comparable key for a version string, or None if it has no usable number.
+    PEP 440 first; otherwise the Windows/registry style numeric run is compared component-wise.
+    """
+    if not v:
+        return None
+    s = v.strip().replace("\\", "")
+    try:
+        return Version(s)
+    except InvalidVersion:
+        pass
+    runs = _NUMERIC.findall(s)
+    if not runs:
+        return None
+    # Prefer a dotted run so "7-Zip 23.01" yields 23.01 rather than 7
+    run = next((r for r in runs if "." in r), runs[0])
+    return Version(re.sub(r"[_-]", ".", run))
+
+class VersionRange(NamedTuple):
+    start_incl: Version | None
+    start_excl: Version | None
+    end_incl: Version | None
+    end_excl: Version | None
+    bounded: bool   # at least one bound declared
+    ok: bool        # every declared bound parsed
+
+def compile_range(s_incl=None, s_excl=None, e_incl=None, e_excl=None, exact=None) -> VersionRange:
+    # A CPE without range bounds but with a concrete version component only affects that version
+    if exact and exact not in ("*", "-") and not (s_incl or s_excl or e_incl or e_excl):
+        s_incl = e_incl = exact
+    raw = (s_incl, s_excl, e_incl, e_excl)
+    keys = [version_key(b) if b else None for b in raw]
+    bounded = any(raw)
+    ok = all(k is not None for k, b in zip(keys, raw) if b)
+    return VersionRange(*keys, bounded=bounded, ok=ok)
+
+UNBOUNDED = compile_range()
+
+def contains(r: VersionRange, key: Version | None) -> bool:
+    if not r.bounded:
+        return True
+    if key is None or not r.ok:
+        return False
+    if r.start_incl is not None and key < r.start_incl: return False
+    if r.start_excl is not None and key <= r.start_excl: return False
+    if r.end_incl is not None and key > r.end_incl: return False
+    if r.end_excl is not None and key >= r.end_excl: return False
+    return True
+
+def which_contain(version: str | None, ranges: Sequence[VersionRange]) -> list[int]:
+    """
+    Indices of the ranges that contain `version`.
+    A missing installed version matches everything (nothing to compare against);
+    an unparseable one only matches unbounded ranges.
+    """
+    if not version:
+        return list(range(len(ranges)))
+    key = version_key(version)
+    memo: dict[VersionRange, bool] = {}
+    out = []
+    for i, r in enumerate(ranges):
+        hit = memo.get(r)
+        if hit is None:
+            hit = memo[r] = contains(r, key)
+        if hit:
+            out.append(i)
+    return out
@@ -0,0 +1,259 @@
+"""
+Offline benchmark suite: seeds a throwaway SQLite database from synth.py and times inventory
+ingest, NVD page processing, match_asset, match_all, CVE full-text search and dashboard API polling.
+Results are written as JSON and can be compared against a saved run; the exit status is 1 when a stage regressed past --tolerance.
+
+    python benchmarks/run.py --assets 500 --cves 20000 --out bench.json
+    python benchmarks/run.py --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synth  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is reported as null there
+    resource = None
+
+# Compared against the baseline: higher is better for *_per_s, lower for the rest
+COMPARE = ("rows_per_s", "p95_ms")
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KiB elsewhere
+
+def pct(sorted_vals: list[float], q: float) -> float | None:
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+class Stage:
+    """Per-operation latencies plus the rows each operation handled."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.rows = 0
+        self.wall = 0.0
+
+    def time(self, fn, rows: int):
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+        self.latencies.append(dt)
+        self.wall += dt
+        self.rows += rows
+        return out
+
+    def result(self, **extra) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "ops": len(lat), "rows": self.rows, "wall_s": round(self.wall, 3),
+            "rows_per_s": round(self.rows / self.wall, 1) if self.wall else None,
+            "p50_ms": round(pct(lat, 0.50) * 1000, 2) if lat else None,
+            "p95_ms": round(pct(lat, 0.95) * 1000, 2) if lat else None,
+            "peak_rss_mb": peak_rss_mb(),
+            **extra,
+        }
+
+def bench_ingest(payloads: list[dict]) -> dict:
+    from app.db import SessionLocal
+    from app.schemas import InventoryPayload
+    from app.services.inventory import apply_inventory
+
+    st = Stage("ingest_inventory")
+    db = SessionLocal()
+    try:
+        for p in payloads:
+            payload = InventoryPayload(**p)
+            st.time(lambda: (apply_inventory(db, payload), db.commit()), len(p["software"]))
+    finally:
+        db.close()
+    return st.result()
+
+def bench_nvd(vulns: list[dict], page_size: int) -> dict:
+    from app.db import SessionLocal
+    from app.services.feed_nvd import _commit_page
+
+    st = Stage("update_nvd_page")
+    db = SessionLocal()
+    try:
+        pages = list(synth.pages(vulns, page_size))
+        for i, page in enumerate(pages):
+            last = i == len(pages) - 1
+            st.time(lambda: _commit_page(db, "bench", page, (i + 1) * page_size, len(vulns), last), len(page))
+    finally:
+        db.close()
+    return st.result(page_size=page_size)
+
+def bench_match_asset(sample: int, seed: int) -> dict:
+    from sqlalchemy import select, func
+    from app.db import SessionLocal
+    from app.models import Asset, Software
+    from app.services.matcher import match_asset
+
+    st = Stage("match_asset")
+    db = SessionLocal()
+    try:
+        ids = db.execute(select(Asset.id)).scalars().all()
+        for aid in random.Random(seed).sample(ids, min(sample, len(ids))):
+            n = db.scalar(select(func.count()).select_from(Software).where(Software.asset_id == aid))
+            st.time(lambda: match_asset(db, aid), n)
+    finally:
+        db.close()
+    return st.result()
+
+def bench_match_all(workers: int, label: str) -> dict:
+    from app.db import SessionLocal
+    from app.services.matcher import match_all, PhaseTimer
+
+    st = Stage(label)
+    db = SessionLocal()
+    try:
+        res = st.time(lambda: match_all(db, PhaseTimer(), workers=workers), 0)
+    finally:
+        db.close()
+    st.rows = res["software"]
+    return st.result(workers=workers, groups=res["groups"], os_builds=res["os_builds"], findings=res["findings"],
+                     timings_ms=res["timings_ms"])
+
+def bench_search(products: list, sample: int, seed: int) -> dict:
+    from app.db import SessionLocal
+    from app.services.cve_search import search
+
+    st = Stage("cve_search")
+    rnd = random.Random(seed)
+    db = SessionLocal()
+    try:
+        # Product names (narrow), vendor prefixes and a broad query hitting ~10% of the corpus, first page of 50 each
+        for p in rnd.sample(products, min(sample, len(products))):
+            for q in (p.product.replace("_", " "), p.vendor[:4] + "*", "microsoft windows"):
+                rows = st.time(lambda: search(db, q, limit=50), 0)
+                st.rows += len(rows or [])
+    finally:
+        db.close()
+    return st.result()
+
+def bench_reads(polls: int) -> dict:
+    from fastapi.testclient import TestClient
+    from app.cache import invalidate_all
+    from app.main import app
+
+    st = Stage("api_reads")
+    urls = ("/assets", "/assets/summary", "/findings?limit=500", "/software/by-asset/1")
+    client = TestClient(app)
+    cold, etags = [], {}
+    # Dashboard polling: one uncached round after a write, then revalidations with If-None-Match
+    invalidate_all()
+    for u in urls:
+        t0 = time.perf_counter()
+        etags[u] = client.get(u).headers.get("etag", "")
+        cold.append(time.perf_counter() - t0)
+    for _ in range(polls):
+        for u in urls:
+            st.time(lambda: client.get(u), 1)
+            st.time(lambda: client.get(u, headers={"If-None-Match": etags[u]}), 1)
+    return st.result(cold_ms=round(sum(cold) * 1000, 2))
+
+def git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints a side-by-side table; returns the metrics that regressed by more than tolerance."""
+    regressed = []
+    print(f"\n{'stage':<22} {'metric':<11} {'baseline':>11} {'current':>11} {'change':>8}")
+    for stage, cur in results.items():
+        base = baseline.get("results", {}).get(stage)
+        if not base:
+            continue
+        for m in COMPARE:
+            b, c = base.get(m), cur.get(m)
+            if not b or c is None:
+                continue
+            change = (c - b) / b
+            worse = -change if m.endswith("_per_s") else change
+            flag = "  !" if worse > tolerance else ""
+            if flag:
+                regressed.append(f"{stage}.{m}")
+            print(f"{stage:<22} {m:<11} {b:>11.1f} {c:>11.1f} {change:>+7.1%}{flag}")
+    return regressed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--assets", type=int, default=500)
+    ap.add_argument("--products", type=int, default=300, help="catalog size (common apps + long tail)")
+    ap.add_argument("--noise", type=int, default=40, help="max never-matching entries per host")
+    ap.add_argument("--cves", type=int, default=20000)
+    ap.add_argument("--page-size", type=int, default=2000)
+    ap.add_argument("--match-sample", type=int, default=50, help="assets timed with match_asset")
+    ap.add_argument("--search-sample", type=int, default=20, help="products whose names are searched")
+    ap.add_argument("--polls", type=int, default=50, help="rounds of dashboard reads")
+    ap.add_argument("--workers", type=int, default=1, help="process pool size for match_all")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help="results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression per metric")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="vm-scout-bench-")
+    os.environ["VM_SCOUT_DB_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    from app.migrations import migrate
+    migrate()
+
+    products = synth.catalog(args.products, args.seed)
+    payloads = list(synth.fleet(args.assets, products, args.noise, args.seed))
+    vulns = list(synth.nvd_corpus(args.cves, products, args.seed))
+
+    results = {}
+    for name, run in (
+        ("ingest_inventory", lambda: bench_ingest(payloads)),
+        ("update_nvd_page", lambda: bench_nvd(vulns, args.page_size)),
+        ("match_all_cold", lambda: bench_match_all(args.workers, "match_all_cold")),
+        ("match_all_warm", lambda: bench_match_all(args.workers, "match_all_warm")),
+        ("match_asset", lambda: bench_match_asset(args.match_sample, args.seed)),
+        ("cve_search", lambda: bench_search(products, args.search_sample, args.seed)),
+        ("api_reads", lambda: bench_reads(args.polls)),
+    ):
+        results[name] = r = run()
+        print(f"{name:<18} rows={r['rows']:>8} {r['rows_per_s'] or 0:>10.0f} rows/s  "
+              f"p50={r['p50_ms']}ms p95={r['p95_ms']}ms  rss={r['peak_rss_mb']}MB", flush=True)
+
+    doc = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git": git_rev(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            print(f"\nregressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
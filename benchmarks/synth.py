@@ -0,0 +1,183 @@
+"""
+Synthetic, deterministic benchmark data: a fleet of Windows hosts whose software lists look like
+what collect.ps1 reads from the Uninstall registry keys, and an NVD API 2.0-shaped CVE corpus
+whose CPE ranges target the same products, so matching produces a realistic hit rate.
+"""
+import functools
+import random
+import string
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+@dataclass(frozen=True)
+class Product:
+    name: str        # Uninstall DisplayName; {v} is replaced with the version, {arch} with an arch suffix
+    publisher: str
+    vendor: str      # CPE vendor/product the corpus uses for it
+    product: str
+    majors: tuple[int, int]
+    popularity: float  # share of hosts that have it installed
+
+# Common Windows software, named the way it shows up in Programs and Features
+COMMON = [
+    Product("Google Chrome", "Google LLC", "google", "chrome", (110, 130), 0.9),
+    Product("Microsoft Edge", "Microsoft Corporation", "microsoft", "edge", (110, 130), 0.95),
+    Product("Mozilla Firefox ({arch} en-US)", "Mozilla", "mozilla", "firefox", (100, 130), 0.4),
+    Product("Mozilla Thunderbird ({arch} en-US)", "Mozilla", "mozilla", "thunderbird", (90, 128), 0.1),
+    Product("7-Zip {v} ({arch})", "Igor Pavlov", "7-zip", "7-zip", (16, 24), 0.5),
+    Product("WinRAR {v} ({arch})", "win.rar GmbH", "rarlab", "winrar", (5, 7), 0.2),
+    Product("VLC media player", "VideoLAN", "videolan", "vlc_media_player", (2, 3), 0.35),
+    Product("Notepad++ ({arch})", "Notepad++ Team", "notepad-plus-plus", "notepad\\+\\+", (7, 8), 0.3),
+    Product("Git", "The Git Development Community", "git-scm", "git", (2, 2), 0.2),
+    Product("Python {v} ({arch})", "Python Software Foundation", "python", "python", (3, 3), 0.25),
+    Product("Java 8 Update {v}", "Oracle Corporation", "oracle", "jre", (8, 8), 0.3),
+    Product("Node.js", "Node.js Foundation", "nodejs", "node.js", (14, 22), 0.15),
+    Product("PuTTY release {v} ({arch})", "Simon Tatham", "putty", "putty", (0, 0), 0.2),
+    Product("WinSCP {v}", "Martin Prikryl", "winscp", "winscp", (5, 6), 0.15),
+    Product("OpenVPN {v}-I001 {arch}", "OpenVPN, Inc.", "openvpn", "openvpn", (2, 2), 0.1),
+    Product("VMware Tools", "VMware, Inc.", "vmware", "tools", (11, 12), 0.3),
+    Product("Docker Desktop", "Docker Inc.", "docker", "desktop", (4, 4), 0.05),
+    Product("Adobe Acrobat Reader DC", "Adobe Systems Incorporated", "adobe", "acrobat_reader_dc", (20, 24), 0.6),
+    Product("Zoom", "Zoom Video Communications, Inc.", "zoom", "zoom", (5, 6), 0.4),
+    Product("Microsoft Teams", "Microsoft Corporation", "microsoft", "teams", (1, 1), 0.6),
+    Product("Microsoft Office Professional Plus 2016", "Microsoft Corporation", "microsoft", "office", (16, 16), 0.5),
+    Product("Microsoft Visual Studio Code", "Microsoft Corporation", "microsoft", "visual_studio_code", (1, 1), 0.2),
+    Product("Wireshark {v} {arch}", "The Wireshark developer community, https://www.wireshark.org", "wireshark", "wireshark", (3, 4), 0.05),
+    Product("KeePass Password Safe {v}", "Dominik Reichl", "keepass", "keepass", (2, 2), 0.1),
+    Product("FileZilla Client {v}", "Tim Kosse", "filezilla-project", "filezilla_client", (3, 3), 0.1),
+]
+
+# Entries every host has plenty of that should never match anything
+NOISE = [
+    ("Microsoft Visual C++ {y} Redistributable ({arch}) - {v}", "Microsoft Corporation"),
+    ("Update for Microsoft Office 2016 (KB{kb}) 64-Bit Edition", "Microsoft"),
+    ("Security Update for Microsoft Office 2016 (KB{kb})", "Microsoft"),
+    ("Microsoft .NET Runtime - {v} ({arch})", "Microsoft Corporation"),
+    ("Microsoft Windows Desktop Runtime - {v} ({arch})", "Microsoft Corporation"),
+    ("Intel(R) Chipset Device Software", "Intel(R) Corporation"),
+    ("Realtek High Definition Audio Driver", "Realtek Semiconductor Corp."),
+    ("NVIDIA Graphics Driver {v}", "NVIDIA Corporation"),
+]
+
+# (OsName, build, NVD product, share of hosts); each build is seen at a dozen monthly update revisions
+WINDOWS = [
+    ("Microsoft Windows 10 Enterprise", 19045, "windows_10_22h2", 0.35),
+    ("Microsoft Windows 11 Enterprise", 22631, "windows_11_23h2", 0.5),
+    ("Microsoft Windows Server 2022 Standard", 20348, "windows_server_2022", 0.15),
+]
+UBRS = [3000 + 100 * i for i in range(12)]
+OS_CVE_SHARE = 0.1
+
+_WORDS = ("data", "cloud", "sync", "secure", "print", "scan", "remote", "backup", "media", "net", "desk", "flow",
+          "vault", "task", "mail", "chart", "build", "link", "view", "edit")
+
+def catalog(n_products: int, seed: int = 42) -> list[Product]:
+    """COMMON plus a long tail of made-up vendors; long-tail names share words, like real ones do."""
+    rnd = random.Random(seed)
+    out = list(COMMON)
+    for i in range(max(0, n_products - len(COMMON))):
+        company = "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(4, 8))) + f"{i}"
+        words = rnd.sample(_WORDS, 2)
+        name = f"{company.capitalize()} {words[0].capitalize()} {words[1].capitalize()}"
+        out.append(Product(name, f"{company.capitalize()} Software Ltd.", company, f"{company}_{words[0]}_{words[1]}",
+                           (1, rnd.randint(1, 12)), rnd.uniform(0.01, 0.15)))
+    return out
+
+@functools.lru_cache(maxsize=None)
+def _releases(key: str, majors: tuple[int, int]) -> tuple[list[str], list[float]]:
+    """5-10 releases per product, oldest first, weighted so most hosts run one of the latest few."""
+    rnd = random.Random(key)
+    vs = {(rnd.randint(*majors), rnd.randint(0, 9), rnd.randint(0, 99)) for _ in range(rnd.randint(5, 10))}
+    vs = sorted(vs)
+    return [".".join(map(str, v)) for v in vs], [0.6 ** (len(vs) - 1 - i) for i in range(len(vs))]
+
+def version(rnd: random.Random, p: Product) -> str:
+    vs, weights = _releases(f"{p.vendor}:{p.product}", p.majors)
+    return rnd.choices(vs, weights)[0]
+
+def _entry(rnd: random.Random, p: Product) -> dict:
+    v = version(rnd, p)
+    name = p.name.format(v=v, arch=rnd.choice(("x64", "x86", "64-bit")))
+    return {"name": name, "version": v, "publisher": p.publisher}
+
+# Office updates hosts pick from, like a few years of monthly patches
+_KBS = [5002000 + 137 * i for i in range(36)]
+
+def _noise(rnd: random.Random) -> dict:
+    tmpl, pub = rnd.choice(NOISE)
+    vs, weights = _releases(tmpl, (1, 14))
+    v = rnd.choices(vs, weights)[0]
+    name = tmpl.format(v=v, y=rnd.choice((2010, 2012, 2013, 2015)), kb=rnd.choice(_KBS),
+                       arch=rnd.choice(("x64", "x86")))
+    return {"name": name, "version": v, "publisher": pub}
+
+def fleet(n_assets: int, products: list[Product], noise: int = 40, seed: int = 42) -> Iterator[dict]:
+    """Inventory payloads (POST /ingest/inventory bodies), one per host."""
+    rnd = random.Random(seed)
+    for a in range(n_assets):
+        installed = [p for p in products if rnd.random() < p.popularity]
+        sw = [_entry(rnd, p) for p in installed]
+        sw += [_noise(rnd) for _ in range(rnd.randint(noise // 2, noise))]
+        os_name, build, _, _ = rnd.choices(WINDOWS, [w[3] for w in WINDOWS])[0]
+        yield {
+            "hostname": f"WS-{a:06d}",
+            "os": {"name": os_name, "version": f"10.0.{build}", "build": f"10.0.{build}.{rnd.choice(UBRS)}"},
+            "software": sw,
+            "services": [{"protocol": "TCP", "local_address": "0.0.0.0", "local_port": port, "process": proc}
+                         for port, proc in ((135, "svchost"), (445, "System"), (3389, "svchost"))[:rnd.randint(1, 3)]]
+                        # Some installed apps listen too, half of them on loopback only
+                        + [{"protocol": "TCP", "local_address": rnd.choice(("0.0.0.0", "127.0.0.1")), "local_port": 10000 + i,
+                            "process": p.name.split()[0].lower()} for i, p in enumerate(installed) if rnd.random() < 0.1],
+        }
+
+def _cvss(rnd: random.Random) -> tuple[float, str]:
+    score = round(rnd.triangular(1.0, 10.0, 7.5), 1)
+    sev = "CRITICAL" if score >= 9 else "HIGH" if score >= 7 else "MEDIUM" if score >= 4 else "LOW"
+    return score, sev
+
+def nvd_corpus(n_cves: int, products: list[Product], seed: int = 42, start_year: int = 2020) -> Iterator[dict]:
+    """
+    NVD API 2.0 "vulnerabilities" items; popular products get proportionally more CVEs and
+    OS_CVE_SHARE of them target a Windows build, fixed in one of its update revisions.
+    """
+    rnd = random.Random(seed)
+    weights = [0.2 + p.popularity for p in products]
+    t0 = datetime(start_year, 1, 1)
+    for i in range(n_cves):
+        score, sev = _cvss(rnd)
+        matches = []
+        if rnd.random() < OS_CVE_SHARE:
+            _, build, product, _ = rnd.choice(WINDOWS)
+            vendor = "microsoft"
+            matches.append({"vulnerable": True, "criteria": f"cpe:2.3:o:microsoft:{product}:*:*:*:*:*:*:x64:*",
+                            "versionEndExcluding": f"10.0.{build}.{rnd.choice(UBRS)}"})
+        else:
+            p = rnd.choices(products, weights)[0]
+            vendor, product = p.vendor, p.product
+            lo_major = rnd.randint(*p.majors)
+            for _ in range(rnd.choice((1, 1, 1, 2, 3))):
+                m = {"vulnerable": True, "criteria": f"cpe:2.3:a:{p.vendor}:{p.product}:*:*:*:*:*:*:*:*"}
+                if rnd.random() < 0.7:
+                    m["versionStartIncluding"] = f"{lo_major}.0"
+                m["versionEndExcluding"] = f"{lo_major + rnd.randint(0, 2)}.{rnd.randint(0, 9)}.{rnd.randint(0, 99)}"
+                matches.append(m)
+        published = t0 + timedelta(minutes=i * 7)
+        yield {"cve": {
+            "id": f"CVE-{published.year}-{100000 + i}",
+            "published": published.strftime("%Y-%m-%dT%H:%M:%S.000"),
+            "lastModified": published.strftime("%Y-%m-%dT%H:%M:%S.000"),
+            "descriptions": [{"lang": "en", "value": f"Synthetic vulnerability in {vendor} {product}."}],
+            "metrics": {"cvssMetricV31": [{"cvssData": {"baseScore": score, "baseSeverity": sev}}]},
+            "configurations": [{"nodes": [{"operator": "OR", "negate": False, "cpeMatch": matches}]}],
+        }}
+
+def pages(items, size: int) -> Iterator[list]:
+    page = []
+    for it in items:
+        page.append(it)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -1,13 +1,28 @@
 param(
-  [string]$ApiUrl = "http://localhost:8000/ingest/inventory"
+  [string]$ApiUrl = "http://localhost:8000/ingest/inventory",
+  [string]$BatchUrl = "http://localhost:8000/ingest/batch",
+  # Send the inventory as one gzip-compressed NDJSON record to the batch endpoint
+  [switch]$Compress
 )
 
+function ConvertTo-GzipBytes([string]$Text) {
+  $bytes = [System.Text.Encoding]::UTF8.GetBytes($Text)
+  $ms = New-Object System.IO.MemoryStream
+  $gz = New-Object System.IO.Compression.GZipStream($ms, [System.IO.Compression.CompressionMode]::Compress)
+  $gz.Write($bytes, 0, $bytes.Length)
+  $gz.Close()
+  return ,$ms.ToArray()
+}
+
 # OS info
 $ci = Get-ComputerInfo | Select-Object OsName, OsVersion, WindowsBuildLabEx
+# Full build with the update revision (e.g. 10.0.19045.4651); WindowsBuildLabEx is not bumped by monthly updates
+$nt = Get-ItemProperty "HKLM:\SOFTWARE\Microsoft\Windows NT\CurrentVersion" -ErrorAction SilentlyContinue
+$build = if ($nt -and $nt.CurrentBuild -and $nt.UBR -ne $null) { "10.0.$($nt.CurrentBuild).$($nt.UBR)" } else { $ci.WindowsBuildLabEx }
 $os = @{
   name    = $ci.OsName
   version = $ci.OsVersion
-  build   = $ci.WindowsBuildLabEx
+  build   = $build
 }
 
 # Installed software from registry
@@ -55,8 +70,14 @@ $payload = [pscustomobject]@{
 
 # Send
 try {
-  $json = $payload | ConvertTo-Json -Depth 6
-  $resp = Invoke-RestMethod -Method POST -Uri $ApiUrl -ContentType "application/json" -Body $json
+  if ($Compress) {
+    $line = ($payload | ConvertTo-Json -Depth 6 -Compress) + "`n"
+    $body = ConvertTo-GzipBytes $line
+    $resp = Invoke-RestMethod -Method POST -Uri $BatchUrl -ContentType "application/x-ndjson" -Headers @{ "Content-Encoding" = "gzip" } -Body $body
+  } else {
+    $json = $payload | ConvertTo-Json -Depth 6
+    $resp = Invoke-RestMethod -Method POST -Uri $ApiUrl -ContentType "application/json" -Body $json
+  }
   Write-Host ("Ingest OK: " + ($resp | ConvertTo-Json -Compress))
 } catch {
   Write-Error $_